@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""demiurge benchmarks.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.suite --save results.json
+    python -m benchmarks.suite --compare results.json
+
+"""
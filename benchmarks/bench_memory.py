@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Compare peak memory of Item.all_from, Item.iter_from and Item.iterparse.
+
+Each mode runs in its own process, extracting all the items from a generated
+page and keeping only a running count (as a streaming consumer would).
+The iterparse mode reads the page from a temporary file.
+
+Usage: python -m benchmarks.bench_memory [rows]
+
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.pages import Torrent, make_page
+
+
+class TorrentRow(Torrent):
+    """Torrent using a simple selector, supported by iterparse."""
+
+    class Meta:
+        selector = 'tr'
+
+
+def consume(mode, rows):
+    html = make_page(rows)
+    if mode == 'iterparse':
+        fd, filename = tempfile.mkstemp(suffix='.html')
+        with os.fdopen(fd, 'w') as f:
+            f.write(html)
+        del html
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if mode == 'all_from':
+        items = Torrent.all_from(html)
+    elif mode == 'iter_from':
+        items = Torrent.iter_from(html)
+    else:
+        items = TorrentRow.iterparse(filename)
+    count = 0
+    for item in items:
+        count += len(item.name or '')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes (Linux)
+    print('%-10s %d rows: peak RSS %.1f MB (+%.1f MB extracting)' % (
+        mode, rows, peak / 1024.0, (peak - baseline) / 1024.0))
+    if mode == 'iterparse':
+        os.remove(filename)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for mode in ('all_from', 'iter_from', 'iterparse'):
+        subprocess.check_call(
+            [sys.executable, '-m', 'benchmarks.bench_memory', '--run', mode,
+             str(rows)])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        consume(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
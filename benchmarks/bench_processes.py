@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Item.map_from throughput with a growing number of processes.
+
+Usage: python -m benchmarks.bench_processes [files] [rows]
+
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.pages import Torrent, make_page
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    tempdir = tempfile.mkdtemp()
+    try:
+        html = make_page(rows)
+        filenames = []
+        for i in range(files):
+            filename = os.path.join(tempdir, '%d.html' % i)
+            with open(filename, 'w') as f:
+                f.write(html)
+            filenames.append(filename)
+
+        processes = 1
+        while processes <= multiprocessing.cpu_count():
+            start = time.time()
+            for source, records in Torrent.map_from(
+                    filenames, processes=processes, chunksize=4):
+                assert len(records) == rows
+            elapsed = time.time() - start
+            print('%2d processes: %.2fs (%.1f documents/s)' % (
+                processes, elapsed, files / elapsed))
+            processes *= 2
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
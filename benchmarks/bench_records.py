@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Compare memory retained by Item instances and detached records.
+
+Each mode runs in its own process, keeping all the extracted items (or
+records) from a generated page, and reports the resident memory once the
+page source is released.
+
+Usage: python -m benchmarks.bench_records [rows]
+
+"""
+
+import ctypes
+import gc
+import os
+import subprocess
+import sys
+
+from benchmarks.pages import Torrent, make_page
+
+
+def rss():
+    """Return current resident memory, in MB (Linux only)."""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024)
+
+
+def release_memory():
+    """Collect garbage and return freed heap memory to the OS (glibc)."""
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def keep(mode, rows):
+    html = make_page(rows)
+    baseline = rss()
+    if mode == 'items':
+        results = Torrent.all_from(html)
+    else:
+        results = Torrent.records_from(html)
+    del html
+    release_memory()
+    print('%-8s %d rows: %.1f MB retained' % (
+        mode, len(results), rss() - baseline))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for mode in ('items', 'records'):
+        subprocess.check_call(
+            [sys.executable, '-m', 'benchmarks.bench_records', '--run', mode,
+             str(rows)])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        keep(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
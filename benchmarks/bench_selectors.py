@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Compare compiled selectors against plain PyQuery selector matching.
+
+'per_item' extracts the fields item by item (Item.iter_from), 'batched'
+extracts each field for all the items at once (Item.all_from).
+
+Usage: python -m benchmarks.bench_selectors [rows]
+
+"""
+
+import sys
+import timeit
+
+import pyquery
+
+from benchmarks.pages import Torrent, make_page
+
+
+def uncompiled(html):
+    """Extraction as done before compiled selectors: pq(selector) calls."""
+    pq = pyquery.PyQuery(html)
+    results = []
+    for row in pq(Torrent._meta.selector).items():
+        results.append((
+            row('td:eq(2) a:eq(1)').eq(0).attr('href'),
+            row('td:eq(2) a:eq(2)').eq(0).text(),
+            row('td:eq(3)').eq(0).text(),
+        ))
+    return results
+
+
+def per_item(html):
+    return [(t.url, t.name, t.size) for t in Torrent.iter_from(html)]
+
+
+def batched(html):
+    return [(t.url, t.name, t.size) for t in Torrent.all_from(html)]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    html = make_page(rows)
+    assert uncompiled(html) == per_item(html) == batched(html)
+
+    print(Torrent.selector_plan())
+    for func in (uncompiled, per_item, batched):
+        best = min(timeit.repeat(lambda: func(html), number=1, repeat=5))
+        print('%-12s %d rows: %.3fs (%.1f us/row)' % (
+            func.__name__, rows, best, best * 1e6 / rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Synthetic pages and items used by the benchmarks."""
+
+import demiurge
+
+
+ROW = """
+<tr>
+    <td>19 Dec 07</td>
+    <td><a href="/cat/7">Software</a></td>
+    <td><a href="/tor/%(i)d">Torrent</a> <a href="/get/%(i)d">Get</a>
+        <a href="/name/%(i)d">Name %(i)d</a></td>
+    <td>695.81 MB</td>
+</tr>
+"""
+
+
+def make_page(rows):
+    """Return a torrents listing page (as Torrent items) with rows."""
+    body = ''.join(ROW % {'i': i} for i in range(rows))
+    return (
+        '<html><body><table class="maintable"><tr><td>ads</td></tr></table>'
+        '<table class="maintable"><tr><th>header</th></tr>%s</table>'
+        '</body></html>' % body)
+
+
+class Torrent(demiurge.Item):
+    url = demiurge.AttributeValueField(
+        selector='td:eq(2) a:eq(1)', attr='href')
+    name = demiurge.TextField(selector='td:eq(2) a:eq(2)')
+    size = demiurge.TextField(selector='td:eq(3)')
+
+    class Meta:
+        selector = 'table.maintable:gt(0) tr:gt(0)'
+
+
+def make_rows_page(rows, fields=4, depth=0):
+    """Return a listing page with rows of 'fields' cells.
+
+    Cell i of row n holds a link to '/item/<n>/<i>' with text '<n>', nested
+    in 'depth' span elements (see make_item).
+
+    """
+    cells = []
+    for i in range(fields):
+        cells.append(
+            '<td class="f%d">%s<a href="/item/%%(n)d/%d">%%(n)d</a>%s</td>' % (
+                i, '<span>' * depth, i, '</span>' * depth))
+    row = '<tr class="row">%s</tr>\n' % ''.join(cells)
+    body = ''.join(row % {'n': n} for n in range(rows))
+    return ('<html><body><div class="header"><a href="/">Home</a></div>'
+            '<table class="listing">%s</table></body></html>' % body)
+
+
+def make_item(fields=4, attr=False, clean=False, coerce=False,
+              base_url='', related=None, backend='pyquery', shared=False,
+              name='Row'):
+    """Return an Item class extracting the make_rows_page cells.
+
+    Fields are TextFields (or AttributeValueFields getting the link href,
+    if 'attr'), optionally with a clean_<field> method and int coercion.
+    'related' is an item class to follow from the first cell link, and
+    'backend' the extraction backend. If 'shared', each cell link also gets
+    its href as a '<field>_url' AttributeValueField (same selector).
+
+    """
+    attrs = {}
+    for i in range(fields):
+        selector = 'td.f%d a' % i
+        field_coerce = int if coerce else None
+        if attr:
+            field = demiurge.AttributeValueField(
+                selector=selector, attr='href', coerce=field_coerce)
+        else:
+            field = demiurge.TextField(selector=selector, coerce=field_coerce)
+        attrs['f%d' % i] = field
+        if shared:
+            attrs['f%d_url' % i] = demiurge.AttributeValueField(
+                selector=selector, attr='href')
+        if clean:
+            attrs['clean_f%d' % i] = lambda self, value: value.lstrip('/')
+    if related is not None:
+        attrs['detail'] = demiurge.RelatedItem(
+            related, selector='td.f0 a', attr='href')
+    attrs['Meta'] = type('Meta', (object,), {
+        'selector': 'table.listing tr.row', 'base_url': base_url,
+        'backend': backend})
+    return type(name, (demiurge.Item,), attrs)
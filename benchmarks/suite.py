@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite: throughput and peak memory of the extraction paths.
+
+Cases cover Item.all_from with varying rows, fields and nesting depth,
+Item.one, file input (by filename, path or memory mapped), TextField and
+AttributeValueField extraction (with the pyquery and lxml backends),
+clean_<field> and coerce overhead, RelatedItem resolution against a local
+HTTP server, and items export (JSON lines, CSV and SQLite).
+
+Each case runs in its own process, reporting the best time of a few runs
+(as items per second) and the peak resident memory growth while running.
+Results can be saved, and compared against saved results: cases whose
+throughput drops (or memory grows) more than the tolerance are reported as
+regressions, and the exit status is 1.
+
+Usage: python -m benchmarks.suite [--quick] [--filter TEXT] [--repeat N]
+           [--save FILE] [--compare FILE] [--tolerance 0.15]
+
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict
+
+import demiurge
+from benchmarks.pages import make_item, make_rows_page
+from tests.httpserver import StubServer
+
+
+# name -> setup(quick), returning (run, items, close)
+CASES = OrderedDict()
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _all_from_case(rows, fields, depth, backend='pyquery'):
+    def setup(quick):
+        count = rows // 10 if quick else rows
+        html = make_rows_page(count, fields=fields, depth=depth)
+        item = make_item(fields, backend=backend)
+        return (lambda: item.all_from(html)), count, None
+    return setup
+
+
+for _rows in (1000, 10000):
+    for _fields in (2, 8):
+        for _depth in (0, 4):
+            case('all_from/rows=%d/fields=%d/depth=%d' % (
+                _rows, _fields, _depth))(
+                    _all_from_case(_rows, _fields, _depth))
+case('all_from/rows=10000/fields=8/depth=0/lxml')(
+    _all_from_case(10000, 8, 0, backend='lxml'))
+
+
+def _one_case(last):
+    def setup(quick):
+        rows = 1000 if quick else 10000
+        document = demiurge.Document.parse(make_rows_page(rows))
+        item = make_item()
+        index = rows - 1 if last else 0
+        return (lambda: document.one(item, index)), 1, None
+    return setup
+
+
+case('one/first')(_one_case(last=False))
+case('one/last')(_one_case(last=True))
+
+
+def _input_case(mode):
+    def setup(quick):
+        rows = 1000 if quick else 10000
+        fd, filename = tempfile.mkstemp(suffix='.html')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(make_rows_page(rows, fields=4).encode('utf-8'))
+        item = make_item(4)
+        if mode == 'filename':
+            run = lambda: item.all_from(filename=filename, parser='html')
+        else:
+            run = lambda: item.all_from_path(filename, mmap=mode == 'mmap')
+        return run, rows, lambda: os.remove(filename)
+    return setup
+
+
+case('input/filename')(_input_case('filename'))
+case('input/path')(_input_case('path'))
+case('input/mmap')(_input_case('mmap'))
+
+
+def _fields_case(**options):
+    def setup(quick):
+        rows = 500 if quick else 5000
+        document = demiurge.Document.parse(make_rows_page(rows, fields=8))
+        item = make_item(8, **options)
+        return (lambda: document.all(item)), rows, None
+    return setup
+
+
+case('fields/text')(_fields_case())
+case('fields/attr')(_fields_case(attr=True))
+case('fields/clean')(_fields_case(clean=True))
+case('fields/coerce')(_fields_case(coerce=True))
+case('fields/clean_coerce')(_fields_case(clean=True, coerce=True))
+case('fields/shared')(_fields_case(shared=True))
+case('fields/text/lxml')(_fields_case(backend='lxml'))
+case('fields/attr/lxml')(_fields_case(attr=True, backend='lxml'))
+
+
+class Detail(demiurge.Item):
+    title = demiurge.TextField(selector='h1')
+
+
+def _related_case(mode):
+    def setup(quick):
+        rows = 20 if quick else 100
+        server = StubServer()
+        for n in range(rows):
+            server.add(
+                '/item/%d/0' % n, '<html><body><h1>%d</h1></body></html>' % n)
+        server.start()
+        session = None
+        if mode == 'session':
+            session = demiurge.Session(maxsize=8)
+            Detail._meta.transport = session
+        html = make_rows_page(rows, fields=1)
+        item = make_item(1, base_url=server.url(), related=Detail)
+
+        def run():
+            items = item.all_from(html)
+            if mode == 'attribute':
+                return [i.detail for i in items]
+            return item.prefetch_related(items, 'detail', workers=8)
+
+        def close():
+            Detail._meta.transport = None
+            if session is not None:
+                session.close()
+            server.stop()
+        return run, rows, close
+    return setup
+
+
+case('related/attribute')(_related_case('attribute'))
+case('related/prefetch')(_related_case('prefetch'))
+case('related/session')(_related_case('session'))
+
+
+def _export_case(exporter):
+    def setup(quick):
+        rows = 2000 if quick else 20000
+        item = make_item(8, coerce=True)
+        items = item.all_from(make_rows_page(rows, fields=8))
+
+        def run():
+            if exporter is demiurge.SQLiteExporter:
+                output = ':memory:'
+            else:
+                output = io.StringIO()
+            with exporter(item, output) as e:
+                e.write(items)
+        return run, rows, None
+    return setup
+
+
+case('export/jsonl')(_export_case(demiurge.JSONLExporter))
+case('export/csv')(_export_case(demiurge.CSVExporter))
+case('export/sqlite')(_export_case(demiurge.SQLiteExporter))
+
+
+def max_rss():
+    """Return the process peak resident memory, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        peak /= 1024.0
+    return peak / 1024.0
+
+
+def run_case(name, quick, repeat):
+    """Run a case in this process, returning its results."""
+    run, items, close = CASES[name](quick)
+    try:
+        # input is ready: measure the memory used while running
+        baseline = max_rss()
+        run()  # warm up (selectors compilation, connections)
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+        peak = max_rss() - baseline
+    finally:
+        if close is not None:
+            close()
+    return {
+        'items': items, 'seconds': best, 'rate': items / best,
+        'peak_mb': peak}
+
+
+def run_suite(names, quick, repeat):
+    """Run each case in a new process, returning the results by name."""
+    results = OrderedDict()
+    for name in names:
+        command = [sys.executable, '-m', 'benchmarks.suite', '--run-case',
+                   name, '--repeat', str(repeat)]
+        if quick:
+            command.append('--quick')
+        output = subprocess.check_output(command)
+        results[name] = json.loads(output.decode('utf-8').splitlines()[-1])
+        print_result(name, results[name])
+    return results
+
+
+def print_result(name, result, saved=None, flags=''):
+    line = '%-36s %12.1f items/s %8.1f MB' % (
+        name, result['rate'], result['peak_mb'])
+    if saved is not None:
+        line += '  (%+6.1f%% rate, %+6.1f MB) %s' % (
+            (result['rate'] / saved['rate'] - 1) * 100,
+            result['peak_mb'] - saved['peak_mb'], flags)
+    print(line.rstrip())
+
+
+def compare(results, saved, tolerance, memory_slack=1.0):
+    """Print the results against saved ones, returning the regressions.
+
+    A case regresses if its rate is lower than the saved one by more than
+    tolerance (a fraction), or if its peak memory grows more than tolerance
+    (and more than memory_slack MB, to ignore noise in small values).
+
+    """
+    regressions = []
+    print('\nCompared to saved results:')
+    for name, result in results.items():
+        if name not in saved:
+            print_result(name, result)
+            continue
+        old = saved[name]
+        flags = []
+        if result['rate'] < old['rate'] * (1 - tolerance):
+            flags.append('SLOWER')
+        memory_growth = result['peak_mb'] - old['peak_mb']
+        if (memory_growth > memory_slack and
+                result['peak_mb'] > old['peak_mb'] * (1 + tolerance)):
+            flags.append('MORE MEMORY')
+        if flags:
+            regressions.append(name)
+        print_result(name, result, old, ' '.join(flags))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run the demiurge benchmark suite.')
+    parser.add_argument('--quick', action='store_true',
+                        help='use smaller inputs (smoke test)')
+    parser.add_argument('--filter', default='',
+                        help='only run cases including this text')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs per case (best time is reported)')
+    parser.add_argument('--save', help='save results as JSON to this file')
+    parser.add_argument('--compare', help='compare against saved results')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed regression, as a fraction')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        result = run_case(args.run_case, args.quick, args.repeat)
+        print(json.dumps(result))
+        return 0
+
+    names = [name for name in CASES if args.filter in name]
+    results = run_suite(names, args.quick, args.repeat)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'quick': args.quick,
+                'results': results,
+            }, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        if saved.get('quick') != args.quick:
+            print('Warning: saved results input sizes differ (--quick)')
+        if compare(results, saved['results'], args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,8 +6,18 @@ __version__ = '0.2'
 
 from .demiurge import (
     AttributeValueField,
+    CompiledSelector,
+    Document,
     Item,
     ItemDoesNotExist,
+    Record,
     RelatedItem,
     TextField,
+    compile_selector,
+    make_column,
 )
+from .cache import DocumentCache, HTTPCache
+from .changes import MemoryStateStore, SQLiteStateStore
+from .export import CSVExporter, JSONLExporter, SQLiteExporter
+from .profiling import Profiler
+from .transport import HTTPError, Scheduler, Session
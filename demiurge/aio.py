@@ -0,0 +1,160 @@
+# -*- coding:utf-8 -*-
+"""Asyncio support for fetching demiurge items.
+
+Requires Python 3.5+. Items are fetched through an async transport, which
+limits the number of concurrent requests; see `Item.aone`, `Item.aall` and
+`Item.arelated`.
+
+"""
+
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import pyquery
+
+from .demiurge import PARSE_KWARGS
+
+
+class AsyncTransport(object):
+    """Base async transport.
+
+    Subclasses implement the `_fetch` coroutine, returning the document for
+    the given URL; `fetch` runs at most 'concurrency' fetches at once (per
+    event loop).
+
+    """
+
+    def __init__(self, concurrency=10):
+        super(AsyncTransport, self).__init__()
+        self.concurrency = concurrency
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_event_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def fetch(self, url, **kwargs):
+        """Return the document at url; kwargs are the request options."""
+        async with self._semaphore():
+            return await self._fetch(url, **kwargs)
+
+    async def _fetch(self, url, **kwargs):
+        raise NotImplementedError(
+            "Custom transports have to implement this method")
+
+
+class ThreadedTransport(AsyncTransport):
+    """Async transport running a blocking opener in a thread pool.
+
+    'opener' is called as `opener(url, kwargs)`; if not specified, PyQuery
+    URL opener is used (requests based, if available).
+
+    """
+
+    def __init__(self, concurrency=10, opener=None):
+        super(ThreadedTransport, self).__init__(concurrency=concurrency)
+        self.opener = opener
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self._executor
+
+    async def _fetch(self, url, **kwargs):
+        opener = self.opener
+        if opener is None:
+            opener = pyquery.pyquery.url_opener
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(opener, url, kwargs))
+
+    def close(self):
+        """Shutdown the thread pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+default_transport = ThreadedTransport()
+
+
+def get_transport(item_class, transport=None):
+    """Return the transport to use for the given item class."""
+    if transport is None:
+        transport = item_class._meta.async_transport
+    if transport is None:
+        transport = default_transport
+    return transport
+
+
+async def fetch_document(item_class, url, transport=None):
+    """Fetch url and return the parsed document, as item_class would."""
+    transport = get_transport(item_class, transport)
+    kwargs = item_class._meta._pyquery_kwargs
+    document_cache = item_class._meta.cache
+    if document_cache is not None:
+        key = document_cache.key(url, kwargs)
+        document = document_cache.get(key)
+        if document is not None:
+            return document
+
+    html = None
+    if document_cache is not None:
+        html = document_cache.get_raw(key)
+    if html is None:
+        request_kwargs = dict(
+            (k, v) for k, v in kwargs.items() if k not in PARSE_KWARGS)
+        html = await transport.fetch(url, **request_kwargs)
+        if document_cache is not None:
+            document_cache.set_raw(key, html, item_class)
+
+    # parse as PyQuery would do for an URL
+    document = item_class._parse_url(
+        url, opener=lambda url, **kwargs: html)
+    if document_cache is not None:
+        document_cache.set(key, document, item_class)
+    return document
+
+
+async def fetch_items(item_class, url, transport=None):
+    """Fetch url and return the PyQuery object matching item elements."""
+    document = await fetch_document(item_class, url, transport=transport)
+    return item_class._select(document)
+
+
+async def one(item_class, path='', index=0, transport=None):
+    """Return ocurrence (the first one, unless specified) of the item."""
+    url = urljoin(item_class._meta.base_url, path)
+    document = await fetch_document(item_class, url, transport=transport)
+    return item_class._select_one(document, index)
+
+
+async def all(item_class, path='', transport=None):
+    """Return all ocurrences of the item."""
+    url = urljoin(item_class._meta.base_url, path)
+    pq_items = await fetch_items(item_class, url, transport=transport)
+    return item_class._build_all(pq_items)
+
+
+async def related(instance, name, transport=None):
+    """Resolve the related item(s) set as attribute name in instance."""
+    descriptor = instance._related[name]
+    value = instance.__dict__.get(descriptor.label, None)
+    if value is None:
+        related_item, source, url = descriptor._target(instance)
+        if url is not None:
+            pq_items = await fetch_items(
+                related_item, url, transport=transport)
+            value = related_item._build_all(pq_items)
+        else:
+            value = related_item.all_from(source)
+        instance.__dict__[descriptor.label] = value
+    return value
@@ -0,0 +1,361 @@
+# -*- coding:utf-8 -*-
+"""Caches of fetched documents."""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pyquery
+
+
+clock = getattr(time, 'monotonic', time.time)
+
+
+class LRUCache(object):
+    """Thread-safe mapping bounded to 'maxsize' entries.
+
+    Least recently used entries are evicted first. If 'ttl' (seconds) is
+    set, entries expire after that time (a different ttl can be given per
+    entry).
+
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get(key) is not None
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= clock():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default."""
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # mark as most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Cache value for key."""
+        if ttl is None:
+            ttl = self.ttl
+        expires = clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove key from cache, if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def delete_matching(self, predicate):
+        """Remove the entries whose value satisfies predicate(value)."""
+        with self._lock:
+            keys = [key for key, (value, expires) in self._entries.items()
+                    if predicate(value)]
+            for key in keys:
+                del self._entries[key]
+
+    def stats(self):
+        """Return hits, misses, evictions and size counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+
+class DocumentCache(object):
+    """Cache of parsed documents, by URL and PyQuery arguments.
+
+    Parsed documents are kept in a LRU cache of 'maxsize' entries. If
+    'raw_maxsize' is set, raw documents (as returned by the opener) are
+    also kept, so a document evicted from the parsed cache can be parsed
+    again without fetching it.
+
+    Set it as *cache* in an item Meta to enable it for that item. Entries
+    are stored with the item class (owner) that fetched them, so each item
+    class can flush its own documents from a shared cache.
+
+    """
+
+    def __init__(self, maxsize=128, ttl=None, raw_maxsize=None, raw_ttl=None):
+        super(DocumentCache, self).__init__()
+        self.documents = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.raw = None
+        if raw_maxsize:
+            self.raw = LRUCache(
+                maxsize=raw_maxsize, ttl=raw_ttl if raw_ttl else ttl)
+
+    def key(self, url, kwargs):
+        """Return cache key for url, requested using kwargs."""
+        return (url, repr(sorted(kwargs.items())))
+
+    def get(self, key):
+        """Return cached parsed document, or None."""
+        entry = self.documents.get(key)
+        if entry is None:
+            return None
+        return entry[0]
+
+    def set(self, key, document, owner=None):
+        """Cache a parsed document, fetched by owner."""
+        self.documents.set(key, (document, owner))
+
+    def get_raw(self, key):
+        """Return cached raw document, or None."""
+        if self.raw is None:
+            return None
+        entry = self.raw.get(key)
+        if entry is None:
+            return None
+        return entry[0]
+
+    def set_raw(self, key, html, owner=None):
+        """Cache a raw document (if raw documents cache is enabled)."""
+        if self.raw is not None:
+            self.raw.set(key, (html, owner))
+
+    def raw_opener(self, key, opener=None, owner=None):
+        """Return a PyQuery opener using the raw documents cache.
+
+        Documents not found in cache are fetched using opener (or PyQuery
+        url opener, if not specified).
+
+        """
+        def open_url(url, **kwargs):
+            html = self.get_raw(key)
+            if html is None:
+                if opener is not None:
+                    html = opener(url, **kwargs)
+                else:
+                    html = pyquery.pyquery.url_opener(url, kwargs)
+                self.set_raw(key, html, owner)
+            return html
+        return open_url
+
+    def clear(self, owner=None):
+        """Flush all cached documents, or only those fetched by owner."""
+        if owner is None:
+            self.documents.clear()
+            if self.raw is not None:
+                self.raw.clear()
+            return
+
+        def owned(entry):
+            return entry[1] is owner
+        self.documents.delete_matching(owned)
+        if self.raw is not None:
+            self.raw.delete_matching(owned)
+
+    def stats(self):
+        """Return cache counters, for parsed and raw documents."""
+        stats = {'documents': self.documents.stats()}
+        if self.raw is not None:
+            stats['raw'] = self.raw.stats()
+        return stats
+
+
+default_cache = DocumentCache()
+
+
+class HTTPCache(object):
+    """Persistent HTTP responses cache, stored in a SQLite database.
+
+    Responses with validators (ETag or Last-Modified headers) are stored
+    with their content; a session using the cache will send conditional
+    requests for cached URLs, reusing the stored content (and, if still
+    in memory, the parsed document) on a 304 Not Modified response.
+
+    Set it as *cache* of a demiurge.Session.
+
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            status INTEGER,
+            headers TEXT,
+            content BLOB,
+            etag TEXT,
+            last_modified TEXT,
+            stored_at REAL,
+            accessed_at REAL
+        )
+    """
+
+    def __init__(self, path=':memory:', documents_maxsize=32):
+        super(HTTPCache, self).__init__()
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # parsed documents, by URL and validators
+        self.documents = LRUCache(maxsize=documents_maxsize)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(self.SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def get(self, url):
+        """Return the cached response entry for url, or None.
+
+        Entries are dicts with url, status, headers, content, etag,
+        last_modified, stored_at and accessed_at keys.
+
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT url, status, headers, content, etag, last_modified, '
+                'stored_at, accessed_at FROM responses WHERE url = ?',
+                (url,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(
+            ('url', 'status', 'headers', 'content', 'etag', 'last_modified',
+             'stored_at', 'accessed_at'), row))
+        entry['headers'] = json.loads(entry['headers'])
+        entry['content'] = bytes(entry['content'])
+        return entry
+
+    def validators(self, url):
+        """Return conditional request headers for url (empty if uncached)."""
+        entry = self.get(url)
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, status, headers, content):
+        """Store a response, if it has validators.
+
+        Return the stored entry (without content), or None.
+
+        """
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        if not etag and not last_modified:
+            return None
+        now = time.time()
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO responses VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?)',
+                    (url, status, json.dumps(headers), sqlite3.Binary(content),
+                     etag, last_modified, now, now))
+        return {'url': url, 'status': status, 'headers': headers,
+                'etag': etag, 'last_modified': last_modified,
+                'stored_at': now, 'accessed_at': now}
+
+    def touch(self, url):
+        """Mark a cached response as accessed (revalidated)."""
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'UPDATE responses SET accessed_at = ? WHERE url = ?',
+                    (time.time(), url))
+
+    def document_key(self, entry, key):
+        """Return parsed document key, for a cached entry and parse key."""
+        return (entry['url'], entry['etag'], entry['last_modified'], key)
+
+    def entries(self):
+        """Return cached entries info (without content), newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT url, etag, last_modified, length(content), '
+                'stored_at, accessed_at FROM responses '
+                'ORDER BY accessed_at DESC').fetchall()
+        return [dict(zip(
+            ('url', 'etag', 'last_modified', 'size', 'stored_at',
+             'accessed_at'), row)) for row in rows]
+
+    def delete(self, url):
+        """Remove url from cache."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM responses WHERE url = ?', (url,))
+
+    def prune(self, max_age=None, max_entries=None):
+        """Remove entries not accessed in max_age seconds, and/or the
+        least recently accessed ones exceeding max_entries.
+
+        Return the number of removed entries.
+
+        """
+        removed = 0
+        with self._lock:
+            with self._db:
+                if max_age is not None:
+                    cursor = self._db.execute(
+                        'DELETE FROM responses WHERE accessed_at < ?',
+                        (time.time() - max_age,))
+                    removed += cursor.rowcount
+                if max_entries is not None:
+                    cursor = self._db.execute(
+                        'DELETE FROM responses WHERE url NOT IN ('
+                        'SELECT url FROM responses '
+                        'ORDER BY accessed_at DESC LIMIT ?)', (max_entries,))
+                    removed += cursor.rowcount
+        self.documents.clear()
+        return removed
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM responses')
+        self.documents.clear()
+
+    def stats(self):
+        """Return hits (304 responses), misses and number of entries."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
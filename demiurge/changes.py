@@ -0,0 +1,137 @@
+# -*- coding:utf-8 -*-
+"""Change detection state, for incremental scrapes."""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+def content_hash(content):
+    """Return the hex digest of a document (or element HTML) content."""
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+class MemoryStateStore(object):
+    """Snapshots of scraped pages, kept in memory.
+
+    A snapshot is the page body hash and the set of hashes of the matched
+    elements, stored by key (the item class and page URL).
+
+    """
+
+    def __init__(self):
+        super(MemoryStateStore, self).__init__()
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def get(self, key):
+        """Return the (body hash, element hashes) snapshot for key, or None.
+        """
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def set(self, key, digest, elements):
+        """Store the snapshot for key, replacing the previous one."""
+        with self._lock:
+            self._snapshots[key] = (digest, frozenset(elements))
+
+    def delete(self, key):
+        """Remove the snapshot for key, if present."""
+        with self._lock:
+            self._snapshots.pop(key, None)
+
+    def clear(self):
+        """Remove all snapshots."""
+        with self._lock:
+            self._snapshots.clear()
+
+
+class SQLiteStateStore(object):
+    """Snapshots of scraped pages, stored in a SQLite database.
+
+    Snapshots persist between runs; elements hashes are written in batches
+    (one transaction per snapshot).
+
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS pages (
+            key TEXT PRIMARY KEY,
+            digest TEXT,
+            updated_at REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS elements (
+            key TEXT,
+            digest TEXT,
+            PRIMARY KEY (key, digest)
+        )
+        """,
+    )
+
+    def __init__(self, path=':memory:'):
+        super(SQLiteStateStore, self).__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            for statement in self.SCHEMA:
+                self._db.execute(statement)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def get(self, key):
+        """Return the (body hash, element hashes) snapshot for key, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT digest FROM pages WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            elements = self._db.execute(
+                'SELECT digest FROM elements WHERE key = ?', (key,))
+            return row[0], frozenset(digest for digest, in elements)
+
+    def set(self, key, digest, elements):
+        """Store the snapshot for key, replacing the previous one."""
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO pages VALUES (?, ?, ?)',
+                    (key, digest, time.time()))
+                self._db.execute('DELETE FROM elements WHERE key = ?', (key,))
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO elements VALUES (?, ?)',
+                    ((key, element) for element in set(elements)))
+
+    def delete(self, key):
+        """Remove the snapshot for key, if present."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM pages WHERE key = ?', (key,))
+                self._db.execute('DELETE FROM elements WHERE key = ?', (key,))
+
+    def clear(self):
+        """Remove all snapshots."""
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM pages')
+                self._db.execute('DELETE FROM elements')
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+default_store = MemoryStateStore()
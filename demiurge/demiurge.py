@@ -1,16 +1,29 @@
 # -*- coding:utf-8 -*-
 
-import sys
-
+import array
+import codecs
+import functools
+import re
+from collections import OrderedDict
+from urllib.parse import urldefrag, urljoin, urlparse, urlunparse
+
+import cssselect
+import lxml.html
 import pyquery
+from lxml import etree
+from pyquery.cssselectpatch import JQueryTranslator
+
+try:
+    from pyquery.text import extract_text
+except ImportError:
+    # pyquery < 1.3
+    extract_text = None
 
+from . import cache, changes, profiling
 
-PY3 = sys.version_info[0] == 3
 
-if PY3:
-    from urllib.parse import urljoin, urlparse
-else:
-    from urlparse import urljoin, urlparse
+# PyQuery arguments not related to the document request
+PARSE_KWARGS = ('parser', 'namespaces', 'css_translator', 'parent')
 
 
 def is_absolute(url):
@@ -18,11 +31,276 @@ def is_absolute(url):
     return bool(urlparse(url).netloc)
 
 
+def visit_key(url):
+    """Return url normalized to check for already visited pages."""
+    parsed = urlparse(urldefrag(url)[0])
+    return urlunparse(parsed._replace(path=parsed.path or '/'))
+
+
+def build_url(base_url, path):
+    """Return the URL for path, relative to base_url unless absolute."""
+    url = path
+    if path and not is_absolute(path):
+        url = urljoin(base_url, path)
+    return url
+
+
 def with_metaclass(meta, base=object):
     """Create a base class with a metaclass."""
     return meta("NewBase", (base,), {})
 
 
+# elements scanned by CompiledSelector.nth before using the positional XPath
+SCAN_LIMIT = 1000
+
+# elements searched per XPath evaluation by CompiledSelector.first_each
+# (libxml2 merges the node-sets found from each one in quadratic time)
+BATCH_SIZE = 128
+
+# combinators, as the axis relating an element to the previous selector
+COMBINATOR_AXES = {
+    ' ': 'ancestor::*', '>': 'parent::*', '+': 'preceding-sibling::*[1]',
+    '~': 'preceding-sibling::*'}
+
+
+def _element_test(tree, translator):
+    """Return an XPath testing the context element against a parsed selector.
+
+    Combinators are translated as conditions on the element ancestors or
+    previous siblings. Return None if the selector has pseudo classes.
+
+    """
+    if isinstance(tree, cssselect.parser.CombinedSelector):
+        test = _element_test(tree.subselector, translator)
+        previous = _element_test(tree.selector, translator)
+        axis = COMBINATOR_AXES.get(tree.combinator)
+        if test is None or previous is None or axis is None:
+            return None
+        return '%s[%s[%s]]' % (test, axis, previous)
+    node = tree
+    while isinstance(node, (cssselect.parser.Class, cssselect.parser.Hash,
+                            cssselect.parser.Attrib)):
+        node = node.selector
+    if not isinstance(node, cssselect.parser.Element):
+        return None
+    return 'self::%s' % translator.xpath(tree)
+
+
+class CompiledSelector(object):
+    """A pyquery selector translated to a reusable lxml XPath.
+
+    Translation follows PyQuery (jQuery pseudo classes like ':eq' included),
+    so matching returns the same elements `pq(selector)` would.
+
+    """
+
+    def __init__(self, selector, xhtml=False, namespaces=None):
+        super(CompiledSelector, self).__init__()
+        self.selector = selector
+        self.xhtml = xhtml
+        self.namespaces = namespaces
+        translator = JQueryTranslator(xhtml=xhtml)
+        css = selector.replace('[@', '[')
+        self.xpath = translator.css_to_xpath(css, 'descendant-or-self::')
+        self._xpath = etree.XPath(self.xpath, namespaces=namespaces)
+        # positional match, and matches count (to skip context elements)
+        self._nth_xpath = etree.XPath(
+            '(%s)[$n]' % self.xpath, namespaces=namespaces)
+        self._count_xpath = etree.XPath(
+            'count(%s)' % self.xpath, namespaces=namespaces)
+        # element test and tag, to scan a document for the first matches
+        self._element_test = self._scan_tag = None
+        parsed = cssselect.parse(css)
+        test = None
+        if len(parsed) == 1:
+            test = _element_test(parsed[0].parsed_tree, translator)
+        if test is not None:
+            self._element_test = etree.XPath(test, namespaces=namespaces)
+            tree = parsed[0].parsed_tree
+            while not isinstance(tree, cssselect.parser.Element):
+                tree = getattr(tree, 'subselector', None) or tree.selector
+            if tree.namespace is None and tree.element is not None:
+                self._scan_tag = (
+                    tree.element if xhtml else tree.element.lower())
+        # same expression, evaluated from a set of context elements at once
+        # (only if matches are inside the context element: '+' and '~'
+        # combinators match its following siblings)
+        self._batch_xpath = None
+        if '|' not in self.xpath and 'following-sibling' not in self.xpath:
+            self._batch_xpath = etree.XPath(
+                '$elements/' + self.xpath, namespaces=namespaces)
+
+    def __repr__(self):
+        return '<CompiledSelector %r: %s>' % (self.selector, self.xpath)
+
+    def all(self, elements):
+        """Return all the elements matching, searching from each element."""
+        results = []
+        for element in elements:
+            results.extend(self._xpath(element))
+        return results
+
+    def first(self, elements):
+        """Return the first element matching, or None."""
+        for element in elements:
+            results = self._xpath(element)
+            if results:
+                return results[0]
+        return None
+
+    def nth(self, elements, index):
+        """Return the element at index of all(elements), or None.
+
+        Searching from a document root, elements are scanned in document
+        order, stopping at the match; otherwise (or if not found within
+        SCAN_LIMIT elements) a positional XPath is used, so the matches
+        before it are never built.
+
+        """
+        if index < 0:
+            results = self.all(elements)
+            return results[index] if -index <= len(results) else None
+        if (self._element_test is not None and len(elements) == 1 and
+                elements[0].getparent() is None):
+            position = index
+            scanned = 0
+            for element in elements[0].iter(self._scan_tag):
+                if scanned == SCAN_LIMIT:
+                    break
+                scanned += 1
+                if self._element_test(element):
+                    if position == 0:
+                        return element
+                    position -= 1
+            else:
+                return None
+        for element in elements:
+            results = self._nth_xpath(element, n=index + 1)
+            if results:
+                return results[0]
+            if len(elements) > 1:
+                index -= int(self._count_xpath(element))
+        return None
+
+    def first_each(self, elements):
+        """Return the first element matching from each element (or None).
+
+        Elements (from the same document) are searched using a single XPath
+        evaluation per BATCH_SIZE elements, mapping the matches back to the
+        element they were found from. Nested elements (or selectors matching
+        outside the context element) are searched one at a time.
+
+        """
+        index = dict((element, i) for i, element in enumerate(elements))
+        batch = (self._batch_xpath is not None and len(elements) > 1 and
+                 len(index) == len(elements))
+        if batch:
+            for element in elements:
+                for ancestor in element.iterancestors():
+                    if ancestor in index:
+                        batch = False
+                        break
+                if not batch:
+                    break
+        if not batch:
+            return [self.first([element]) for element in elements]
+
+        results = [None] * len(elements)
+        for start in range(0, len(elements), BATCH_SIZE):
+            batch = elements[start:start + BATCH_SIZE]
+            for match in self._batch_xpath(batch[0], elements=batch):
+                node = match
+                i = index.get(node)
+                while i is None and node is not None:
+                    node = node.getparent()
+                    i = index.get(node)
+                if i is None:
+                    # not inside any element, can't tell where it's from
+                    return [self.first([element]) for element in elements]
+                if results[i] is None:
+                    results[i] = match
+        return results
+
+
+_compiled_selectors = {}
+
+
+def compile_selector(selector, xhtml=False, namespaces=None):
+    """Return a CompiledSelector for selector, translating it only once."""
+    ns_key = tuple(sorted(namespaces.items())) if namespaces else None
+    key = (selector, xhtml, ns_key)
+    compiled = _compiled_selectors.get(key)
+    if compiled is None:
+        compiled = CompiledSelector(
+            selector, xhtml=xhtml, namespaces=namespaces)
+        _compiled_selectors[key] = compiled
+    return compiled
+
+
+def _compile_for(pq, selector):
+    """Return the compiled selector matching the given PyQuery settings."""
+    return compile_selector(
+        selector, xhtml=pq._translator.xhtml, namespaces=pq.namespaces)
+
+
+def compile_element_selector(selector, xhtml=False):
+    """Return an XPath matching an element itself against selector.
+
+    Only simple selectors (a tag, optionally with classes, id and attribute
+    conditions) are supported; raise ValueError otherwise.
+
+    """
+    parsed = cssselect.parse(selector)
+    node = parsed[0].parsed_tree if len(parsed) == 1 else None
+    while isinstance(node, (cssselect.parser.Class, cssselect.parser.Hash,
+                            cssselect.parser.Attrib)):
+        node = node.selector
+    if not isinstance(node, cssselect.parser.Element):
+        raise ValueError(
+            "'%s' is not a simple selector (tag, class, id or attribute "
+            "conditions only)" % selector)
+    translator = JQueryTranslator(xhtml=xhtml)
+    return etree.XPath(translator.css_to_xpath(selector, 'self::'))
+
+
+def select_all(pq, selector):
+    """Return a PyQuery object with all the elements matching selector.
+
+    Equivalent to `pq(selector)`, using the compiled selector.
+
+    """
+    elements = _compile_for(pq, selector).all(pq)
+    return pq._copy(elements, parent=pq)
+
+
+def select_first_each(rows, selector):
+    """Return select_first(row, selector) for each PyQuery object in rows.
+
+    Rows with a single element (as returned by `PyQuery.items`) are matched
+    all at once (see CompiledSelector.first_each).
+
+    """
+    if not rows:
+        return []
+    if any(len(row) != 1 for row in rows):
+        return [select_first(row, selector) for row in rows]
+    compiled = _compile_for(rows[0], selector)
+    matches = compiled.first_each([row[0] for row in rows])
+    return [row._copy([] if element is None else [element], parent=row)
+            for row, element in zip(rows, matches)]
+
+
+def select_first(pq, selector):
+    """Return a PyQuery object with the first element matching selector.
+
+    Equivalent to `pq(selector).eq(0)`, using the compiled selector.
+
+    """
+    element = _compile_for(pq, selector).first(pq)
+    elements = [] if element is None else [element]
+    return pq._copy(elements, parent=pq)
+
+
 class BaseField(object):
     """Base demiurge field."""
 
@@ -45,6 +323,37 @@ class BaseField(object):
         raise NotImplementedError(
             "Custom fields have to implement this method")
 
+    def get_values(self, rows):
+        """Extract values from each of the given PyQuery elements."""
+        return [self.get_value(pq) for pq in rows]
+
+    def supports_matches(self):
+        """Whether the value depends only on the first selector match.
+
+        If so, the match can be shared with other fields (and related
+        items) using the same selector.
+
+        """
+        return False
+
+    def supports_elements(self):
+        """Whether values can be extracted from lxml elements directly.
+
+        True if the field implements _element_value (and its extraction is
+        not customized by a subclass, or in the instance); see LxmlBackend.
+
+        """
+        customized = ('_value', 'get_value', 'get_values')
+        if any(name in self.__dict__ for name in customized):
+            return False
+        for klass in type(self).__mro__:
+            attrs = klass.__dict__
+            if '_element_value' in attrs:
+                return True
+            if any(name in attrs for name in customized):
+                return False
+        return False
+
 
 class TextField(BaseField):
     """Simple text field.
@@ -64,17 +373,44 @@ class TextField(BaseField):
         if value is not None:
             return value.strip()
 
-    def get_value(self, pq):
+    def _value(self, tag):
+        """Return the value for the tag found using selector."""
         value = None
-
-        tag = pq
-        if self.selector is not None:
-            tag = pq(self.selector).eq(0)
-
         if tag:
             value = tag.text()
         return value
 
+    def _element_value(self, element):
+        """Return the value for the lxml element found using selector."""
+        if element is None:
+            return None
+        if extract_text is None or element.tag == 'textarea':
+            return pyquery.PyQuery([element]).text()
+        # as PyQuery text(), without creating the PyQuery object
+        return extract_text(element)
+
+    def get_value(self, pq):
+        tag = pq
+        if self.selector is not None:
+            tag = select_first(pq, self.selector)
+        return self._value(tag)
+
+    def supports_matches(self):
+        # extraction not customized (by a subclass, or in the instance)
+        return (
+            getattr(self.get_value, '__func__', None) is TextField.get_value
+            and getattr(self.get_values, '__func__', None) is
+            TextField.get_values)
+
+    def get_values(self, rows):
+        if type(self).get_value is not TextField.get_value:
+            # custom extraction, do not batch
+            return super(TextField, self).get_values(rows)
+        tags = rows
+        if self.selector is not None:
+            tags = select_first_each(rows, self.selector)
+        return [self._value(tag) for tag in tags]
+
 
 class AttributeValueField(TextField):
     """Simple text field, getting an attribute value.
@@ -90,20 +426,128 @@ class AttributeValueField(TextField):
             selector=selector, coerce=coerce)
         self.attr = attr
 
-    def get_value(self, pq):
+    def _value(self, tag):
         value = None
-
-        if self.selector is not None:
-            tag = pq(self.selector).eq(0)
-        else:
-            tag = pq
-
         if tag and self.attr is not None:
             html_elem = tag[0]
             value = html_elem.get(self.attr)
-
         return value
 
+    def _element_value(self, element):
+        if element is None or self.attr is None:
+            return None
+        return element.get(self.attr)
+
+
+def _first_matches(selector, elements, document, matches):
+    """Return the first element matching selector from each element.
+
+    Results are memoized by selector in the matches dict.
+
+    """
+    found = matches.get(selector)
+    if found is None:
+        compiled = _compile_for(document, selector)
+        found = matches[selector] = compiled.first_each(elements)
+    return found
+
+
+class PyQueryBackend(object):
+    """Extract items values from PyQuery objects (the default backend)."""
+
+    def rows(self, pq_items):
+        """Return the rows to extract items from (PyQuery elements)."""
+        return list(pq_items.items())
+
+    def attach(self, item, row, pq_items):
+        """Set row as the item source."""
+        item._pq = row
+
+    def value(self, field, item):
+        """Extract field value from item source."""
+        selector = getattr(field, 'selector', None)
+        if selector is None or not field.supports_matches():
+            return field.get_value(item._pq)
+        pq = item._pq
+        element = item._match(selector)
+        return field._value(
+            pq._copy([] if element is None else [element], parent=pq))
+
+    def values(self, field, rows, pq_items, matches):
+        """Extract field values from each of the rows.
+
+        Selector matches are shared between fields using the matches dict.
+
+        """
+        selector = getattr(field, 'selector', None)
+        if selector is None or not field.supports_matches() or not rows:
+            return field.get_values(rows)
+        elements = _first_matches(
+            selector, [row[0] for row in rows], pq_items, matches)
+        return [field._value(row._copy(
+                    [] if element is None else [element], parent=row))
+                for row, element in zip(rows, elements)]
+
+
+class LxmlBackend(PyQueryBackend):
+    """Extract items values from lxml elements directly.
+
+    Rows are the matching lxml elements; fields are matched using the
+    compiled selectors, getting text (as PyQuery text() does) or attribute
+    values from lxml, creating no PyQuery objects. Custom fields are still
+    given PyQuery objects, and the item PyQuery object (used by related
+    items and html) is created on demand.
+
+    """
+
+    def rows(self, pq_items):
+        return list(pq_items)
+
+    def attach(self, item, row, pq_items):
+        item.__dict__['_element'] = row
+        item.__dict__['_document'] = pq_items
+
+    def value(self, field, item):
+        if not field.supports_elements():
+            return field.get_value(item._pq)
+        selector = getattr(field, 'selector', None)
+        if selector is not None:
+            return field._element_value(item._match(selector))
+        elements, document = item._source()
+        if len(elements) != 1:
+            return field.get_value(item._pq)
+        return field._element_value(elements[0])
+
+    def values(self, field, rows, pq_items, matches):
+        if not field.supports_elements():
+            return field.get_values(
+                [pq_items._copy([row], parent=pq_items) for row in rows])
+        selector = getattr(field, 'selector', None)
+        elements = rows
+        if selector is not None:
+            elements = _first_matches(selector, rows, pq_items, matches)
+        return [field._element_value(element) for element in elements]
+
+
+BACKENDS = {
+    'pyquery': PyQueryBackend(),
+    'lxml': LxmlBackend(),
+}
+
+
+def get_backend(value):
+    """Return the extraction backend for a 'backend' option value."""
+    if value is None:
+        return BACKENDS['pyquery']
+    if isinstance(value, str):
+        try:
+            return BACKENDS[value]
+        except KeyError:
+            raise ValueError(
+                "Unknown backend '%s' (available: %s)" % (
+                    value, ', '.join(sorted(BACKENDS))))
+    return value
+
 
 class RelatedItem(object):
     """Set a related demiurge item.
@@ -123,34 +567,56 @@ class RelatedItem(object):
         self.attr = attr
 
     def _build_url(self, instance, path):
-        url = path
-        if path and not is_absolute(path):
-            url = urljoin(instance._meta.base_url, path)
-        return url
+        return build_url(instance._meta.base_url, path)
+
+    def _target(self, instance):
+        """Return the related item class, its source and URL to follow.
+
+        The URL is None if the related item should be scraped from source.
+
+        """
+        # default: use given item object as base
+        source = instance._pq
+
+        if self.selector:
+            # if selector provided, traversing from the item
+            element = instance._match(self.selector)
+            source = source._copy(
+                [] if element is None else [element], parent=source)
+
+        related_item = self.item
+        if related_item == 'self':
+            # if 'self', use parent item class
+            related_item = instance.__class__
+
+        url = None
+        if self.attr:
+            # if attr is provided,
+            # assume we are searching for an url to follow
+            html_elem = source[0]
+            path = html_elem.get(self.attr)
+            url = self._build_url(instance, path)
+        return related_item, source, url
+
+    def _resolve(self, instance):
+        """Return the related item(s) for instance."""
+        related_item, source, url = self._target(instance)
+        if url is not None:
+            return related_item._fetch_items(url)
+        return related_item.all_from(source)
 
     def __get__(self, instance, owner):
+        if instance is None:
+            return self
         value = instance.__dict__.get(self.label, None)
         if value is None:
-            # default: use given item object as base
-            source = instance._pq
-
-            if self.selector:
-                # if selector provided, traversing from the item
-                source = source(self.selector).eq(0)
-
-            if self.attr:
-                # if attr is provided,
-                # assume we are searching for an url to follow
-                html_elem = source[0]
-                path = html_elem.get(self.attr)
-                source = self._build_url(instance, path)
-
-            related_item = self.item
-            if related_item == 'self':
-                # if 'self', use parent item class
-                related_item = instance.__class__
-
-            value = related_item.all_from(source)
+            profiler = profiling.active
+            if profiler is not None:
+                value = profiler.call(
+                    owner.__name__, self.label, 'related', self._resolve,
+                    instance)
+            else:
+                value = self._resolve(instance)
             instance.__dict__[self.label] = value
         return value
 
@@ -158,6 +624,38 @@ class RelatedItem(object):
         raise AttributeError('RelatedItem cannot be set.')
 
 
+class LazyField(object):
+    """Lazy item field.
+
+    Used instead of setting values on init when the item Meta has 'lazy'
+    enabled. The field value is extracted (and cleaned) on first access and
+    then stored in the instance.
+
+    """
+
+    def __init__(self, name, field):
+        super(LazyField, self).__init__()
+        self.name = name
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance._extract(self.name, self.field)
+        instance.__dict__[self.name] = value
+        return value
+
+
+def get_related(bases, attrs):
+    related = [(name, obj) for name, obj in attrs.items()
+               if isinstance(obj, RelatedItem)]
+    # add inherited related items
+    for base in bases[::-1]:
+        if hasattr(base, '_related'):
+            related = list(base._related.items()) + related
+    return dict(related)
+
+
 def get_fields(bases, attrs):
     fields = [(field_name, attrs.pop(field_name)) for field_name, obj in
               list(attrs.items()) if isinstance(obj, BaseField)]
@@ -168,19 +666,71 @@ def get_fields(bases, attrs):
     return dict(fields)
 
 
+def get_document_cache(value):
+    """Return the documents cache for a 'cache' option value."""
+    if value is True:
+        return cache.default_cache
+    if value is False:
+        return None
+    return value
+
+
 class ItemOptions(object):
     """Meta options for an item."""
 
-    DEMIURGE_VALUES = ('selector', 'base_url')
+    DEMIURGE_VALUES = (
+        'selector', 'base_url', 'lazy', 'transport', 'async_transport',
+        'cache', 'detach', 'keep_html', 'next_page', 'backend', 'state')
 
     def __init__(self, meta):
         self.selector = getattr(meta, 'selector', 'html')
         self.base_url = getattr(meta, 'base_url', '')
+        self.lazy = getattr(meta, 'lazy', False)
+        self.detach = getattr(meta, 'detach', False)
+        self.keep_html = getattr(meta, 'keep_html', False)
+        self.backend = get_backend(getattr(meta, 'backend', None))
+        # next page link: a selector (using href) or a (selector, attr) pair
+        self.next_page = getattr(meta, 'next_page', None)
+        if isinstance(self.next_page, (tuple, list)):
+            self.next_page_selector, self.next_page_attr = self.next_page
+        else:
+            self.next_page_selector, self.next_page_attr = (
+                self.next_page, 'href')
+        self.transport = getattr(meta, 'transport', None)
+        self.async_transport = getattr(meta, 'async_transport', None)
+        self.cache = get_document_cache(getattr(meta, 'cache', None))
+        # change detection snapshots store (see Item.iter_changed)
+        self.state = getattr(meta, 'state', None)
         attrs = getattr(meta, '__dict__', {})
         self._pyquery_kwargs = {}
         for attr, value in attrs.items():
             if (attr not in self.DEMIURGE_VALUES and not attr.startswith('_')):
                 self._pyquery_kwargs[attr] = value
+        self.xhtml = self._pyquery_kwargs.get('parser') == 'xml'
+        self.namespaces = self._pyquery_kwargs.get('namespaces')
+        self.plan = {}
+
+    def compile(self, fields, related):
+        """Compile item, fields and related items selectors."""
+        def compiled(selector):
+            if selector is None:
+                return None
+            return compile_selector(
+                selector, xhtml=self.xhtml, namespaces=self.namespaces)
+
+        self.compiled_selector = compiled(self.selector)
+        # related items selectors, sharing the matches with fields
+        self.related_selectors = frozenset(
+            obj.selector for obj in related.values() if obj.selector)
+        self.plan = {
+            'selector': self.compiled_selector,
+            'fields': dict(
+                (name, compiled(getattr(field, 'selector', None)))
+                for name, field in fields.items()),
+            'related': dict(
+                (name, compiled(obj.selector))
+                for name, obj in related.items()),
+        }
 
 
 class ItemMeta(type):
@@ -193,11 +743,479 @@ class ItemMeta(type):
                 obj.label = field_name
         # set up fields
         attrs['_fields'] = get_fields(bases, attrs)
+        attrs['_related'] = get_related(bases, attrs)
         new_class = super(ItemMeta, cls).__new__(cls, name, bases, attrs)
         new_class._meta = ItemOptions(getattr(new_class, 'Meta', None))
+        # translate selectors once, per class
+        new_class._meta.compile(new_class._fields, new_class._related)
+        if new_class._meta.lazy:
+            # extract field values on first access
+            for field_name, field in new_class._fields.items():
+                setattr(new_class, field_name, LazyField(field_name, field))
         return new_class
 
 
+class Record(object):
+    """Base class for compact item records.
+
+    Records only keep the item fields values (and the item HTML, if the
+    item Meta 'keep_html' is set), dropping the parsed document.
+
+    """
+
+    __slots__ = ()
+    _item_class = None
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_record(self):
+        """Return the record values, as a dict."""
+        return dict(zip(self.__slots__, self._values()))
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                self._values() == other._values())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self._values()))
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+    def __reduce__(self):
+        return (_make_record, (self._item_class, self._values()))
+
+
+def _make_record(item_class, values):
+    """Rebuild an item record (used for unpickling)."""
+    return item_class.record_class()(*values)
+
+
+# array typecodes and numpy dtypes for numeric coerced columns
+NUMERIC_COLUMNS = {
+    int: ('q', 'int64'),
+    float: ('d', 'float64'),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def import_numpy():
+    """Return the numpy module, or None if not installed.
+
+    NumPy is only imported when first needed, it is slow to import.
+
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def make_column(values, coerce=None):
+    """Return a column for values, coerced using coerce.
+
+    Numeric (int or float) columns are returned as NumPy arrays, if NumPy is
+    available, or as array.array otherwise; any other column (or one with
+    missing values) is returned as a list.
+
+    """
+    column_types = NUMERIC_COLUMNS.get(coerce)
+    if column_types is None or None in values:
+        return values
+    typecode, dtype = column_types
+    numpy = import_numpy()
+    try:
+        if numpy is not None:
+            return numpy.array(values, dtype=dtype)
+        return array.array(typecode, values)
+    except (OverflowError, TypeError, ValueError):
+        return values
+
+
+def _related_links(item, names=None):
+    """Yield (related item class, URL, label) for the item links.
+
+    Only related items (given by name, or all) following links are
+    considered, skipping those already resolved or without link.
+
+    """
+    related = item._related
+    if names is None:
+        names = [name for name, descriptor in related.items()
+                 if descriptor.attr]
+    for name in names:
+        descriptor = related.get(name)
+        if descriptor is None or not descriptor.attr:
+            continue
+        if item.__dict__.get(descriptor.label, None) is not None:
+            continue
+        try:
+            related_item, source, url = descriptor._target(item)
+        except IndexError:
+            # link not found
+            continue
+        if url:
+            yield related_item, url, descriptor.label
+
+
+def _fetch_pending(executor, pending):
+    """Fetch related items URLs in parallel, caching them in the items.
+
+    'pending' maps (related item class, URL) keys to the URL to fetch and
+    the (item, label) pairs linking to it. Return a list of (key, related
+    items) pairs.
+
+    """
+    futures = dict(
+        (key, executor.submit(key[0]._fetch_items, url))
+        for key, (url, instances) in pending.items())
+    results = []
+    for key, (url, instances) in pending.items():
+        value = futures[key].result()
+        for instance, label in instances:
+            instance.__dict__[label] = list(value)
+        results.append((key, value))
+    return results
+
+
+def _records_from(args):
+    """Return the records for the items in a source (process pool task)."""
+    item_class, source = args
+    if isinstance(source, dict):
+        items = item_class.iter_from(**source)
+    else:
+        items = item_class.iter_from(filename=source)
+    return source, [item.as_record() for item in items]
+
+
+def _default_opener(url, **kwargs):
+    return pyquery.pyquery.url_opener(url, kwargs)
+
+
+def parse_url(url, kwargs, opener=None, item_name=''):
+    """Fetch url using opener and return the document parsed with kwargs."""
+    profiler = profiling.active
+    if profiler is not None:
+        return _profiled_parse_url(profiler, item_name, url, kwargs, opener)
+    return _parse_url(url, kwargs, opener)
+
+
+def _parse_url(url, kwargs, opener=None, timed=None):
+    """Fetch and parse url; timed wraps the parse (or fetch) function."""
+    if hasattr(opener, 'open_document'):
+        # transport may reuse documents parsed before
+        def parse(html):
+            return pyquery.PyQuery(
+                url=url, opener=lambda url, **kw: html, **kwargs)
+        if timed is not None:
+            parse = timed(parse)
+        request_kwargs = dict(
+            (k, v) for k, v in kwargs.items() if k not in PARSE_KWARGS)
+        return opener.open_document(
+            url, request_kwargs, parse, key=repr(sorted(kwargs.items())))
+
+    if timed is not None:
+        opener = timed(opener or _default_opener)
+    if opener is not None:
+        kwargs = dict(kwargs, opener=opener)
+    return pyquery.PyQuery(url=url, **kwargs)
+
+
+def _profiled_parse_url(profiler, item_name, url, kwargs, opener):
+    """Like parse_url, recording fetch and parse times."""
+    # the transport parses documents itself, the opener is only fetching
+    if hasattr(opener, 'open_document'):
+        inner_phase, outer_phase = 'parse', 'fetch'
+    else:
+        inner_phase, outer_phase = 'fetch', 'parse'
+    inner = []
+
+    def timed(func):
+        def wrapper(*args, **kw):
+            start = profiling.clock()
+            try:
+                return func(*args, **kw)
+            finally:
+                inner.append(profiling.clock() - start)
+        return wrapper
+
+    start = profiling.clock()
+    try:
+        return _parse_url(url, kwargs, opener, timed=timed)
+    finally:
+        elapsed = profiling.clock() - start
+        if inner:
+            profiler.add(item_name, '', inner_phase, sum(inner))
+        profiler.add(item_name, '', outer_phase, elapsed - sum(inner))
+
+
+def fetch_document(url, kwargs, transport=None, document_cache=None,
+                   item_name='', owner=None):
+    """Return the parsed document for url, using document_cache if set.
+
+    Documents are cached as fetched by owner (see DocumentCache.clear).
+
+    """
+    if document_cache is None:
+        return parse_url(url, kwargs, transport, item_name)
+
+    key = document_cache.key(url, kwargs)
+    document = document_cache.get(key)
+    if document is None:
+        opener = document_cache.raw_opener(key, transport, owner)
+        document = parse_url(url, kwargs, opener, item_name)
+        document_cache.set(key, document, owner)
+    return document
+
+
+def fetch_body(url, kwargs, opener=None, item_name=''):
+    """Fetch url using opener, returning the unparsed document."""
+    if opener is None:
+        opener = _default_opener
+    request_kwargs = dict(
+        (k, v) for k, v in kwargs.items() if k not in PARSE_KWARGS)
+    profiler = profiling.active
+    if profiler is not None:
+        return profiler.call(
+            item_name, '', 'fetch', lambda: opener(url, **request_kwargs))
+    return opener(url, **request_kwargs)
+
+
+def parse_body(url, body, kwargs, item_name=''):
+    """Parse a document fetched from url (see fetch_body) with kwargs."""
+    parse_kwargs = dict(
+        (k, v) for k, v in kwargs.items() if k in PARSE_KWARGS)
+
+    def parse():
+        return pyquery.PyQuery(
+            url=url, opener=lambda url, **kw: body, **parse_kwargs)
+    return timed_parse(item_name, parse)
+
+
+def timed_parse(item_name, parse):
+    """Return the document from calling parse(), timing the parse phase."""
+    profiler = profiling.active
+    if profiler is not None:
+        return profiler.call(item_name, '', 'parse', parse)
+    return parse()
+
+
+# bytes searched for a document encoding declaration (as browsers do)
+SNIFF_SIZE = 1024
+# size of the chunks fed to the parser from file objects
+READ_SIZE = 64 * 1024
+
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+META_CHARSET = re.compile(
+    br'<meta\s[^>]*?charset\s*=\s*["\']?\s*([-\w.:]+)', re.IGNORECASE)
+
+
+def detect_encoding(data):
+    """Return the encoding declared by a document bytes, or None.
+
+    Look for a byte order mark, or a <meta> charset (or http-equiv
+    Content-Type) declaration within the first SNIFF_SIZE bytes.
+
+    """
+    head = bytes(data[:SNIFF_SIZE])
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(mark):
+            return encoding
+    match = META_CHARSET.search(head)
+    if match is None:
+        return None
+    encoding = match.group(1).decode('ascii')
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return None
+    return encoding
+
+
+def _document_parser(parser, encoding):
+    """Return the lxml parser for a PyQuery parser name and encoding."""
+    if parser == 'xml':
+        return etree.XMLParser(encoding=encoding)
+    if parser not in (None, 'html'):
+        raise ValueError(
+            "Bytes input is parsed as 'html' or 'xml', not %r" % parser)
+    try:
+        return lxml.html.HTMLParser(encoding=encoding)
+    except LookupError:
+        # unknown to libxml2, which then guesses the encoding itself
+        return lxml.html.HTMLParser()
+
+
+def _wrap_document(root, kwargs):
+    """Return a PyQuery document for root, as parsed with kwargs."""
+    kwargs = dict(kwargs, parser=kwargs.get('parser') or 'html')
+    return pyquery.PyQuery([] if root is None else [root], **kwargs)
+
+
+def parse_bytes(data, kwargs, encoding=None):
+    """Parse a document from a bytes-like object, with PyQuery kwargs.
+
+    data may be bytes, a memoryview or a mmap object: lxml reads it in
+    place, without decoding it first. The document is parsed as HTML, unless
+    kwargs parser is 'xml'. Unless given, the HTML encoding is detected from
+    the document (see detect_encoding).
+
+    """
+    parser = kwargs.get('parser')
+    if encoding is None and parser != 'xml':
+        encoding = detect_encoding(data)
+    root = etree.fromstring(data, _document_parser(parser, encoding))
+    return _wrap_document(root, kwargs)
+
+
+def parse_file(source, kwargs, encoding=None):
+    """Parse a document from a binary file object, with PyQuery kwargs.
+
+    Seekable files are read by lxml; others are read in chunks of READ_SIZE
+    bytes, fed to the parser. See parse_bytes.
+
+    """
+    parser = kwargs.get('parser')
+    chunk = source.read(SNIFF_SIZE)
+    if not chunk:
+        return parse_bytes(chunk, kwargs, encoding)
+    if encoding is None and parser != 'xml':
+        encoding = detect_encoding(chunk)
+    target = _document_parser(parser, encoding)
+    if getattr(source, 'seekable', lambda: False)():
+        source.seek(-len(chunk), 1)
+        return _wrap_document(etree.parse(source, target).getroot(), kwargs)
+    while chunk:
+        target.feed(chunk)
+        chunk = source.read(READ_SIZE)
+    return _wrap_document(target.close(), kwargs)
+
+
+def parse_path(path, kwargs, encoding=None, mapped=False):
+    """Parse a document from a file path, with PyQuery kwargs.
+
+    If mapped, the file is memory mapped, and parsed as a buffer (so the OS
+    pages it in as needed); otherwise it is read by lxml. See parse_bytes.
+
+    """
+    with open(path, 'rb') as f:
+        if not mapped:
+            return parse_file(f, kwargs, encoding)
+        import mmap
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return parse_bytes(b'', kwargs, encoding)
+        try:
+            return parse_bytes(data, kwargs, encoding)
+        finally:
+            data.close()
+
+
+class Document(object):
+    """A parsed document, shared by several item classes.
+
+    The document is fetched and parsed once, and each item class selects
+    its ocurrences from the same tree:
+
+        page = demiurge.Document.fetch('http://example.com/')
+        torrents = page.all(Torrent)
+        stats = page.one(Stats)
+
+    """
+
+    def __init__(self, pq, url=None):
+        super(Document, self).__init__()
+        self.pq = pq
+        self.url = url
+
+    def __repr__(self):
+        return '<Document %s>' % (self.url or 'from source')
+
+    @classmethod
+    def fetch(cls, url, transport=None, cache=None, **kwargs):
+        """Fetch and parse url, passing kwargs to PyQuery.
+
+        'transport' and 'cache' are like the Item Meta options; if a
+        documents cache is set, the document is stored there, so items
+        sharing the cache (and parser kwargs) reuse it, also when resolving
+        related items linking to url.
+
+        """
+        document_cache = get_document_cache(cache)
+        document = fetch_document(
+            url, kwargs, transport, document_cache, item_name=cls.__name__)
+        return cls(document, url=url)
+
+    @classmethod
+    def parse(cls, *args, **kwargs):
+        """Parse a document passing PyQuery args explicitly."""
+        return cls(timed_parse(
+            cls.__name__, lambda: pyquery.PyQuery(*args, **kwargs)))
+
+    @classmethod
+    def parse_bytes(cls, data, encoding=None, **kwargs):
+        """Parse a document from bytes, a memoryview or a mmap object.
+
+        The encoding is detected from the document, unless given; kwargs
+        are PyQuery parse options (parser, namespaces).
+
+        """
+        return cls(timed_parse(
+            cls.__name__, lambda: parse_bytes(data, kwargs, encoding)))
+
+    @classmethod
+    def parse_file(cls, source, encoding=None, **kwargs):
+        """Parse a document from a binary file object (see parse_bytes)."""
+        return cls(timed_parse(
+            cls.__name__, lambda: parse_file(source, kwargs, encoding)))
+
+    @classmethod
+    def parse_path(cls, path, mmap=False, encoding=None, **kwargs):
+        """Parse a document from a file path, memory mapped if mmap.
+
+        See parse_bytes.
+
+        """
+        return cls(timed_parse(
+            cls.__name__,
+            lambda: parse_path(path, kwargs, encoding, mapped=mmap)))
+
+    def select(self, item_class):
+        """Return the PyQuery object of item_class matching elements."""
+        return item_class._select(self.pq)
+
+    def all(self, item_class):
+        """Return all ocurrences of item_class in the document."""
+        return item_class._build_all(self.select(item_class))
+
+    def iter_all(self, item_class):
+        """Iterate over all ocurrences of item_class in the document."""
+        for i in self.select(item_class).items():
+            yield item_class._build(i)
+
+    def one(self, item_class, index=0):
+        """Return ocurrence (the first one, unless specified) of item_class.
+        """
+        return item_class._select_one(self.pq, index)
+
+
 class ItemDoesNotExist(Exception):
     """Item does not exist."""
 
@@ -210,45 +1228,748 @@ class Item(with_metaclass(ItemMeta)):
             raise ValueError('PyQuery object expected')
 
         self._pq = item
-        for field_name, field in self._fields.items():
-            raw_value = field.get_value(self._pq)
-            value = field.clean(raw_value)
-            clean_field = getattr(self, 'clean_%s' % field_name, None)
-            if clean_field:
-                value = clean_field(value)
-            value = field.coerce(value)
-            setattr(self, field_name, value)
+        if not self._meta.lazy:
+            for field_name, field in self._fields.items():
+                setattr(self, field_name, self._extract(field_name, field))
+            if not self._meta.related_selectors:
+                # matches are only kept for related items
+                self.__dict__.pop('_matches', None)
+
+    @property
+    def _pq(self):
+        """PyQuery object for the item element (created on first use)."""
+        pq = self.__dict__.get('_pq')
+        if pq is None:
+            document = self.__dict__['_document']
+            pq = document._copy([self.__dict__['_element']], parent=document)
+            self.__dict__['_pq'] = pq
+        return pq
+
+    @_pq.setter
+    def _pq(self, value):
+        self.__dict__['_pq'] = value
+
+    def _source(self):
+        """Return the item elements, and the document they belong to."""
+        element = self.__dict__.get('_element')
+        if element is not None:
+            return [element], self.__dict__['_document']
+        pq = self._pq
+        return pq, pq
+
+    def _match(self, selector):
+        """Return the first element matching selector (memoized), or None.
+        """
+        matches = self.__dict__.get('_matches')
+        if matches is None:
+            matches = self.__dict__['_matches'] = {}
+        try:
+            return matches[selector]
+        except KeyError:
+            elements, document = self._source()
+            element = _compile_for(document, selector).first(elements)
+            matches[selector] = element
+            return element
+
+    def _extract(self, field_name, field):
+        """Extract, clean and coerce the given field value."""
+        backend = self._meta.backend
+        profiler = profiling.active
+        if profiler is not None:
+            raw_value = profiler.call(
+                type(self).__name__, field_name, 'extract', backend.value,
+                field, self)
+        else:
+            raw_value = backend.value(field, self)
+        return self._clean_value(field_name, field, raw_value)
+
+    def _clean_value(self, field_name, field, raw_value):
+        """Clean and coerce an extracted field value."""
+        profiler = profiling.active
+        if profiler is not None:
+            return self._profiled_clean_value(
+                profiler, field_name, field, raw_value)
+        value = field.clean(raw_value)
+        clean_field = getattr(self, 'clean_%s' % field_name, None)
+        if clean_field:
+            value = clean_field(value)
+        return field.coerce(value)
+
+    def _profiled_clean_value(self, profiler, field_name, field, raw_value):
+        """Like _clean_value, recording each step time."""
+        item_name = type(self).__name__
+        value = profiler.call(
+            item_name, field_name, 'clean', field.clean, raw_value)
+        clean_field = getattr(self, 'clean_%s' % field_name, None)
+        if clean_field:
+            value = profiler.call(
+                item_name, field_name, 'clean_method', clean_field, value)
+        return profiler.call(
+            item_name, field_name, 'coerce', field.coerce, value)
+
+    @classmethod
+    def _extract_values(cls, field_name, field, rows, pq_items, matches):
+        """Return the field raw values for all the rows (see _build_all)."""
+        backend = cls._meta.backend
+        profiler = profiling.active
+        if profiler is None:
+            return backend.values(field, rows, pq_items, matches)
+        start = profiling.clock()
+        values = backend.values(field, rows, pq_items, matches)
+        # recorded per row, as when extracting values item by item
+        profiler.add(cls.__name__, field_name, 'extract',
+                     profiling.clock() - start, count=len(rows))
+        return values
+
+    @classmethod
+    def _build_all(cls, pq_items):
+        """Return the items for all the given elements.
+
+        Each field values are extracted for all the elements at once (unless
+        the item is lazy or defines its own __init__).
+
+        """
+        if cls._meta.lazy or cls.__init__ is not Item.__init__:
+            return [cls._build(row) for row in pq_items.items()]
+
+        backend = cls._meta.backend
+        rows = backend.rows(pq_items)
+        # selectors matches, shared by fields using the same selector
+        matches = {}
+        raw_values = dict(
+            (field_name, cls._extract_values(
+                field_name, field, rows, pq_items, matches))
+            for field_name, field in cls._fields.items())
+        # and by related items
+        shared = [selector for selector in cls._meta.related_selectors
+                  if selector in matches]
+        items = []
+        for i, row in enumerate(rows):
+            item = cls.__new__(cls)
+            backend.attach(item, row, pq_items)
+            if shared:
+                item.__dict__['_matches'] = dict(
+                    (selector, matches[selector][i]) for selector in shared)
+            for field_name, field in cls._fields.items():
+                value = item._clean_value(
+                    field_name, field, raw_values[field_name][i])
+                setattr(item, field_name, value)
+            if cls._meta.detach:
+                item = item.detach()
+            items.append(item)
+        return items
+
+    def as_record(self):
+        """Return the item fields values, as a dict."""
+        return dict(
+            (field_name, getattr(self, field_name))
+            for field_name in self._fields)
+
+    @classmethod
+    def record_class(cls):
+        """Return the compact record class for the item (see detach)."""
+        record_class = cls.__dict__.get('_record_class')
+        if record_class is None:
+            slots = tuple(sorted(cls._fields))
+            if cls._meta.keep_html:
+                slots += ('html',)
+            record_class = type(
+                '%sRecord' % cls.__name__, (Record,),
+                {'__slots__': slots, '_item_class': cls})
+            cls._record_class = record_class
+        return record_class
+
+    def detach(self):
+        """Return a compact record with the item values.
+
+        The record keeps no reference to the parsed document; the item HTML
+        is kept only if the item Meta 'keep_html' is set.
+
+        """
+        record_class = self.record_class()
+        return record_class(*[
+            self.html if name == 'html' else getattr(self, name)
+            for name in record_class.__slots__])
+
+    @classmethod
+    def _build(cls, pq_item):
+        """Return the item for the given element (detached, if set)."""
+        item = cls(item=pq_item)
+        if cls._meta.detach:
+            return item.detach()
+        return item
 
     @property
     def html(self):
         """Original HTML snippet from which values where extracted."""
         return self._pq.html()
 
+    @classmethod
+    def selector_plan(cls):
+        """Return the compiled selectors used by the item, as XPath.
+
+        A dict with the item 'selector' XPath, and the 'fields' and
+        'related' items selectors XPath (None if no selector was specified).
+
+        """
+        def xpath(compiled):
+            return compiled.xpath if compiled is not None else None
+
+        plan = cls._meta.plan
+        return {
+            'selector': xpath(plan['selector']),
+            'fields': dict(
+                (name, xpath(compiled))
+                for name, compiled in plan['fields'].items()),
+            'related': dict(
+                (name, xpath(compiled))
+                for name, compiled in plan['related'].items()),
+        }
+
+    @classmethod
+    def _select(cls, pq):
+        """Return the PyQuery object of item elements in document pq."""
+        profiler = profiling.active
+        if profiler is not None:
+            start = profiling.clock()
+        compiled = cls._meta.compiled_selector
+        if (pq._translator.xhtml != compiled.xhtml or
+                pq.namespaces != compiled.namespaces):
+            compiled = _compile_for(pq, cls._meta.selector)
+        elements = compiled.all(pq)
+        if profiler is not None:
+            profiler.add(
+                cls.__name__, '', 'select', profiling.clock() - start)
+        return pq._copy(elements, parent=pq)
+
+    @classmethod
+    def _select_one(cls, pq, index=0):
+        """Return the item built from the element at index in document pq.
+
+        Raise ItemDoesNotExist if there are not enough matching elements.
+
+        """
+        profiler = profiling.active
+        if profiler is not None:
+            start = profiling.clock()
+        compiled = cls._meta.compiled_selector
+        if (pq._translator.xhtml != compiled.xhtml or
+                pq.namespaces != compiled.namespaces):
+            compiled = _compile_for(pq, cls._meta.selector)
+        element = compiled.nth(pq, index)
+        if profiler is not None:
+            profiler.add(
+                cls.__name__, '', 'select', profiling.clock() - start)
+        if element is None:
+            raise ItemDoesNotExist("%s not found" % cls.__name__)
+        return cls._build(pq._copy([element], parent=pq))
+
+    @classmethod
+    def _parse(cls, *args, **kwargs):
+        """Parse a document passing PyQuery args, timing the parse phase."""
+        return timed_parse(
+            cls.__name__, lambda: pyquery.PyQuery(*args, **kwargs))
+
     @classmethod
     def _get_items(cls, *args, **kwargs):
-        pq = pyquery.PyQuery(*args, **kwargs)
-        items = pq(cls._meta.selector)
-        return items
+        return cls._select(cls._parse(*args, **kwargs))
+
+    @classmethod
+    def _parse_url(cls, url, opener=None):
+        """Fetch url and return the parsed document."""
+        if opener is None:
+            opener = cls._meta.transport
+        return parse_url(
+            url, cls._meta._pyquery_kwargs, opener, item_name=cls.__name__)
+
+    @classmethod
+    def _fetch_document(cls, url):
+        """Return the parsed document for url, using cache if enabled."""
+        return fetch_document(
+            url, cls._meta._pyquery_kwargs, cls._meta.transport,
+            cls._meta.cache, item_name=cls.__name__, owner=cls)
+
+    @classmethod
+    def _fetch(cls, url):
+        """Fetch url and return the PyQuery object of matching elements."""
+        return cls._select(cls._fetch_document(url))
+
+    @classmethod
+    def flush_cache(cls):
+        """Flush the documents fetched by the item, if cache is enabled.
+
+        Only this item class documents are flushed, even if its cache is
+        shared with other items.
+
+        """
+        if cls._meta.cache is not None:
+            cls._meta.cache.clear(owner=cls)
+
+    @classmethod
+    def _fetch_items(cls, url):
+        """Fetch url and return the matching items."""
+        return cls._build_all(cls._fetch(url))
+
+    @classmethod
+    def iter_from(cls, *args, **kwargs):
+        """Iterate over items passing PyQuery args explicitly.
+
+        Like all_from, but items are created as they are consumed.
+
+        """
+        pq_items = cls._get_items(*args, **kwargs)
+        for i in pq_items.items():
+            yield cls._build(i)
+
+    @classmethod
+    def one_from(cls, *args, **kwargs):
+        """Return an item ocurrence passing PyQuery args explicitly.
+
+        The ocurrence is the first one, unless an 'index' keyword argument
+        is given; matching stops at that ocurrence.
+
+        """
+        index = kwargs.pop('index', 0)
+        return cls._select_one(cls._parse(*args, **kwargs), index)
+
+    @classmethod
+    def iterparse(cls, source, parser=None, huge_tree=True):
+        """Iterate over items from a document, parsing it incrementally.
+
+        'source' is a filename or file object. The document is parsed as
+        HTML, unless parser (or the Meta parser) is 'xml'. The Meta selector
+        should be a simple one: a tag, optionally with classes, id and
+        attribute conditions (e.g. 'div.result').
+
+        Items are created as soon as their element is parsed; their
+        elements (and everything parsed before them) are cleared once the
+        next item is requested, keeping memory usage flat for big
+        documents; so item values (and related items from the item HTML)
+        should be read before moving to the next one. Nested matching
+        elements are yielded when their end tag is found (inner ones first).
+
+        """
+        if parser is None:
+            parser = cls._meta._pyquery_kwargs.get('parser', 'html')
+        xml = parser == 'xml'
+        matches = compile_element_selector(cls._meta.selector, xhtml=xml)
+
+        events = etree.iterparse(
+            source, events=('start', 'end'), html=not xml,
+            huge_tree=huge_tree)
+        open_matches = []
+        for event, element in events:
+            if event == 'start':
+                if matches(element):
+                    open_matches.append(element)
+                continue
+            if not open_matches or open_matches[-1] is not element:
+                continue
+
+            open_matches.pop()
+            yield cls._build(pyquery.PyQuery([element], parser=parser))
+            if not open_matches:
+                # drop the element and everything parsed before it
+                element.clear()
+                node = element
+                while node.getparent() is not None:
+                    while node.getprevious() is not None:
+                        del node.getparent()[0]
+                    node = node.getparent()
+
+    @classmethod
+    def iterparse_one(cls, source, index=0, parser=None, huge_tree=True):
+        """Return an item ocurrence, parsing the document incrementally.
+
+        Like iterparse, but parsing stops as soon as the ocurrence at index
+        (the first one, unless specified) is found.
+
+        """
+        items = cls.iterparse(source, parser=parser, huge_tree=huge_tree)
+        try:
+            for i, item in enumerate(items):
+                if i == index:
+                    return item
+        finally:
+            items.close()
+        raise ItemDoesNotExist("%s not found" % cls.__name__)
 
     @classmethod
     def all_from(cls, *args, **kwargs):
         """Query for items passing PyQuery args explicitly."""
+        return cls._build_all(cls._get_items(*args, **kwargs))
+
+    @classmethod
+    def _parse_kwargs(cls, kwargs):
+        """Return the Meta PyQuery parse options, updated with kwargs."""
+        options = dict(
+            (k, v) for k, v in cls._meta._pyquery_kwargs.items()
+            if k in PARSE_KWARGS)
+        options.update(kwargs)
+        return options
+
+    @classmethod
+    def all_from_bytes(cls, data, encoding=None, **kwargs):
+        """Query for items in a document given as bytes.
+
+        data may also be a memoryview or a mmap object, read by the parser
+        in place. The document is parsed as HTML (unless the Meta or kwargs
+        parser is 'xml'), in the given encoding or the one it declares.
+
+        """
+        kwargs = cls._parse_kwargs(kwargs)
+        document = timed_parse(
+            cls.__name__, lambda: parse_bytes(data, kwargs, encoding))
+        return cls._build_all(cls._select(document))
+
+    @classmethod
+    def all_from_file(cls, source, encoding=None, **kwargs):
+        """Query for items in a document read from a binary file object.
+
+        See all_from_bytes.
+
+        """
+        kwargs = cls._parse_kwargs(kwargs)
+        document = timed_parse(
+            cls.__name__, lambda: parse_file(source, kwargs, encoding))
+        return cls._build_all(cls._select(document))
+
+    @classmethod
+    def all_from_path(cls, path, mmap=False, encoding=None, **kwargs):
+        """Query for items in a document read from a file path.
+
+        If mmap, the file is memory mapped instead of read. See
+        all_from_bytes.
+
+        """
+        kwargs = cls._parse_kwargs(kwargs)
+        document = timed_parse(
+            cls.__name__,
+            lambda: parse_path(path, kwargs, encoding, mapped=mmap))
+        return cls._build_all(cls._select(document))
+
+    @classmethod
+    def records_from(cls, *args, **kwargs):
+        """Like all_from, but returning compact records (see detach)."""
+        items = cls.all_from(*args, **kwargs)
+        if not cls._meta.detach:
+            items = [item.detach() for item in items]
+        return items
+
+    @classmethod
+    def map_from(cls, sources, processes=None, chunksize=1, ordered=True):
+        """Extract items from many documents using a pool of processes.
+
+        Each source is a filename, or a dict of all_from keyword arguments.
+        Yield a (source, records) tuple per source, where records is the
+        list of items values as dicts (see as_record). Results follow the
+        sources order if 'ordered', or as each document is done otherwise.
+
+        The item class should be importable (defined at module level), to
+        be available to the worker processes.
+
+        """
+        import multiprocessing
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            tasks = ((cls, source) for source in sources)
+            if ordered:
+                results = pool.imap(_records_from, tasks, chunksize)
+            else:
+                results = pool.imap_unordered(_records_from, tasks, chunksize)
+            for result in results:
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @classmethod
+    def columns_from(cls, *args, **kwargs):
+        """Query for items passing PyQuery args explicitly, by columns.
+
+        Return a dict mapping each field name to the list of its values for
+        all the items found. Fields coerced to int or float are returned as
+        numeric arrays (see make_column).
+
+        """
         pq_items = cls._get_items(*args, **kwargs)
-        return [cls(item=i) for i in pq_items.items()]
+        backend = cls._meta.backend
+        rows = backend.rows(pq_items)
+        matches = {}
+        # clean_<field> methods are called on a bare instance, for each row
+        instance = cls.__new__(cls)
+        columns = {}
+        for field_name, field in cls._fields.items():
+            values = []
+            raw_values = cls._extract_values(
+                field_name, field, rows, pq_items, matches)
+            for row, raw_value in zip(rows, raw_values):
+                instance.__dict__.clear()
+                backend.attach(instance, row, pq_items)
+                values.append(
+                    instance._clean_value(field_name, field, raw_value))
+            columns[field_name] = make_column(values, field._coerce)
+        return columns
+
+    @classmethod
+    def document(cls, path=''):
+        """Fetch a document as this item would, to share with other items.
+
+        The returned demiurge.Document uses the item Meta base_url,
+        transport, cache and PyQuery options.
+
+        """
+        url = urljoin(cls._meta.base_url, path)
+        return Document(cls._fetch_document(url), url=url)
 
     @classmethod
     def one(cls, path='', index=0):
         """Return ocurrence (the first one, unless specified) of the item."""
         url = urljoin(cls._meta.base_url, path)
-        pq_items = cls._get_items(url=url, **cls._meta._pyquery_kwargs)
-        item = pq_items.eq(index)
-        if not item:
-            raise ItemDoesNotExist("%s not found" % cls.__name__)
-        return cls(item=item)
+        return cls._select_one(cls._fetch_document(url), index)
+
+    @classmethod
+    def iter_all(cls, path=''):
+        """Iterate over all ocurrences of the item.
+
+        Like all, but items are created as they are consumed.
+
+        """
+        url = urljoin(cls._meta.base_url, path)
+        for i in cls._fetch(url).items():
+            yield cls._build(i)
+
+    @classmethod
+    def _snapshot(cls, path, store):
+        """Fetch the item page and compare it with its last snapshot.
+
+        Return None if the page body is unchanged; otherwise, return the
+        PyQuery object of item elements, the elements hashes, the previous
+        snapshot hashes and a function saving the new snapshot.
+
+        """
+        if store is None:
+            store = cls._meta.state
+        if store is None:
+            store = changes.default_store
+        url = urljoin(cls._meta.base_url, path)
+        kwargs = cls._meta._pyquery_kwargs
+        body = fetch_body(
+            url, kwargs, cls._meta.transport, item_name=cls.__name__)
+        digest = changes.content_hash(body)
+        key = '%s.%s %s' % (cls.__module__, cls.__name__, url)
+        previous = store.get(key)
+        if previous is not None and previous[0] == digest:
+            return None
+
+        pq_items = cls._select(
+            parse_body(url, body, kwargs, item_name=cls.__name__))
+        hashes = [
+            changes.content_hash(etree.tostring(element, with_tail=False))
+            for element in pq_items]
+        seen = previous[1] if previous is not None else frozenset()
+        return pq_items, hashes, seen, lambda: store.set(key, digest, hashes)
+
+    @classmethod
+    def iter_changed(cls, path='', store=None):
+        """Iterate over the item ocurrences new or modified since last time.
+
+        The page body and each item element HTML are hashed, and compared
+        with the snapshot saved by the previous call: if the body didn't
+        change, the page is not even parsed; otherwise, only items whose
+        element HTML is new are created. The new snapshot is saved once
+        all the items are consumed.
+
+        Snapshots are kept in store (or the Meta state), a
+        demiurge.MemoryStateStore or demiurge.SQLiteStateStore; by default,
+        a store in memory shared by all items.
+
+        """
+        snapshot = cls._snapshot(path, store)
+        if snapshot is None:
+            return
+        pq_items, hashes, seen, save = snapshot
+        changed = [
+            element for element, digest in zip(pq_items, hashes)
+            if digest not in seen]
+        if changed:
+            items = cls._build_all(
+                pq_items._copy(changed, parent=pq_items._parent))
+            for item in items:
+                yield item
+        save()
+
+    @classmethod
+    def all_if_changed(cls, path='', store=None):
+        """Return all ocurrences of the item, or None if the page is
+        unchanged since last time (see iter_changed).
+        """
+        snapshot = cls._snapshot(path, store)
+        if snapshot is None:
+            return None
+        pq_items, hashes, seen, save = snapshot
+        items = cls._build_all(pq_items)
+        save()
+        return items
+
+    @classmethod
+    def _next_page_url(cls, document, url):
+        """Return the next page URL linked from document, or None."""
+        link = select_first(document, cls._meta.next_page_selector)
+        if not link:
+            return None
+        path = link[0].get(cls._meta.next_page_attr)
+        if not path:
+            return None
+        return build_url(url, path)
+
+    @classmethod
+    def crawl(cls, path='', max_pages=None):
+        """Iterate over the item ocurrences, following the next pages.
+
+        Next page links are found using the Meta 'next_page' selector (and
+        optionally, attribute). Each next page is fetched while the items
+        from the current one are extracted; pages already visited are not
+        fetched again, and at most 'max_pages' pages are crawled.
+
+        """
+        if cls._meta.next_page_selector is None:
+            raise ValueError(
+                "%s Meta does not define next_page" % cls.__name__)
+
+        url = urljoin(cls._meta.base_url, path)
+        visited = set([visit_key(url)])
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            next_document = executor.submit(cls._fetch_document, url)
+            pages = 0
+            while next_document is not None:
+                document = next_document.result()
+                pages += 1
+                next_document = None
+                next_url = cls._next_page_url(document, url)
+                if next_url is not None:
+                    next_url = urldefrag(next_url)[0]
+                if (next_url is not None and
+                        visit_key(next_url) not in visited and
+                        (max_pages is None or pages < max_pages)):
+                    # prefetch next page
+                    visited.add(visit_key(next_url))
+                    next_document = executor.submit(
+                        cls._fetch_document, next_url)
+                    url = next_url
+
+                for item in cls._build_all(cls._select(document)):
+                    yield item
+        finally:
+            executor.shutdown(wait=False)
 
     @classmethod
     def all(cls, path=''):
         """Return all ocurrences of the item."""
         url = urljoin(cls._meta.base_url, path)
-        pq_items = cls._get_items(url=url, **cls._meta._pyquery_kwargs)
-        return [cls(item=i) for i in pq_items.items()]
+        return cls._fetch_items(url)
+
+    @classmethod
+    def prefetch_related(cls, items, name, workers=None):
+        """Resolve the related item(s) set as attribute name for all items.
+
+        URLs to follow are collected from every item and fetched once each,
+        in parallel using a pool of 'workers' threads; results are cached in
+        the items, as if the attribute was accessed. Return the given items.
+
+        """
+        descriptor = cls._related[name]
+        pending = {}
+        for item in items:
+            if item.__dict__.get(descriptor.label, None) is not None:
+                continue
+            try:
+                related_item, source, url = descriptor._target(item)
+            except IndexError:
+                # link not found, left unresolved
+                continue
+            if url is None:
+                item.__dict__[descriptor.label] = related_item.all_from(source)
+            else:
+                pending.setdefault((related_item, url), (url, []))[1].append(
+                    (item, descriptor.label))
+
+        if pending:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                _fetch_pending(executor, pending)
+        return items
+
+    @classmethod
+    def walk(cls, path='', related=None, max_depth=None, workers=None,
+             max_frontier=None):
+        """Breadth-first crawl following related items links.
+
+        Starting from the item ocurrences in path (depth 0), follow the
+        related items given by name in 'related' (by default, all the
+        related items following links) level by level, yielding a
+        (depth, item) tuple for each item found. Links found in a level are
+        fetched in parallel using a pool of 'workers' threads, up to
+        'max_frontier' distinct URLs per level; URLs already visited are
+        not fetched again, and links are not followed beyond 'max_depth'.
+
+        Related items fetched are also cached in the items, as if the
+        attribute was accessed.
+
+        """
+        url = urljoin(cls._meta.base_url, path)
+        visited = set([(cls, visit_key(url))])
+        level = cls.all(path)
+        depth = 0
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while level:
+                for item in level:
+                    yield depth, item
+                if max_depth is not None and depth >= max_depth:
+                    break
+
+                pending = OrderedDict()
+                for item in level:
+                    links = _related_links(item, related)
+                    for related_item, link_url, label in links:
+                        key = (related_item, visit_key(link_url))
+                        if key in visited:
+                            continue
+                        if (key not in pending and max_frontier is not None
+                                and len(pending) >= max_frontier):
+                            continue
+                        fetch_url = urldefrag(link_url)[0]
+                        pending.setdefault(key, (fetch_url, []))[1].append(
+                            (item, label))
+                visited.update(pending)
+
+                level = []
+                for key, value in _fetch_pending(executor, pending):
+                    level.extend(value)
+                depth += 1
+
+    @classmethod
+    def aone(cls, path='', index=0, transport=None):
+        """Coroutine version of `one`, fetching using an async transport.
+
+        If transport is not specified, the Meta 'async_transport' is used
+        (or the default demiurge.aio transport).
+
+        """
+        from . import aio
+        return aio.one(cls, path=path, index=index, transport=transport)
+
+    @classmethod
+    def aall(cls, path='', transport=None):
+        """Coroutine version of `all`, fetching using an async transport."""
+        from . import aio
+        return aio.all(cls, path=path, transport=transport)
+
+    def arelated(self, name, transport=None):
+        """Coroutine resolving the related item(s) set as attribute name."""
+        from . import aio
+        return aio.related(self, name, transport=transport)
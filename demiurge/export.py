@@ -0,0 +1,260 @@
+# -*- coding:utf-8 -*-
+"""Streaming exporters of items to JSON lines, CSV and SQLite."""
+
+import csv
+import io
+import itertools
+import json
+import operator
+import sqlite3
+import threading
+
+# rows written at once (one transaction per batch, for SQLite)
+BATCH_SIZE = 1000
+
+# SQLite column types for coerced fields (any other field is untyped)
+SQLITE_TYPES = {
+    int: 'INTEGER',
+    float: 'REAL',
+}
+
+
+def _getter(names):
+    """Return a function getting the names attributes of an object, as a
+    tuple."""
+    if not names:
+        return lambda obj: ()
+    if len(names) == 1:
+        name = names[0]
+        return lambda obj: (getattr(obj, name),)
+    return operator.attrgetter(*names)
+
+
+def _related_class(item_class, descriptor):
+    if descriptor.item == 'self':
+        return item_class
+    return descriptor.item
+
+
+class Layout(object):
+    """Export columns of an item class, and the rows for its items.
+
+    Columns are the item fields (sorted by name), followed by the fields of
+    each related item named in 'related', flattened as <related>__<field>
+    columns. Use layout() to get the (cached) layout for an item class.
+
+    """
+
+    def __init__(self, item_class, related=()):
+        super(Layout, self).__init__()
+        fields = tuple(sorted(item_class._fields))
+        self.columns = list(fields)
+        self.coerce = [item_class._fields[name]._coerce for name in fields]
+        self._get = _getter(fields)
+        self._related = []
+        for name in related:
+            descriptor = item_class._related.get(name)
+            if descriptor is None:
+                raise ValueError(
+                    '%s has no related item %r' % (item_class.__name__, name))
+            related_class = _related_class(item_class, descriptor)
+            related_fields = tuple(sorted(related_class._fields))
+            self.columns.extend(
+                '%s__%s' % (name, field) for field in related_fields)
+            self.coerce.extend(
+                related_class._fields[field]._coerce
+                for field in related_fields)
+            self._related.append((
+                operator.attrgetter(name), _getter(related_fields),
+                (None,) * len(related_fields)))
+        self.columns = tuple(self.columns)
+
+    def rows(self, items):
+        """Iterate over the values tuples (in columns order) of items.
+
+        If related items are flattened, there is a row per related item (per
+        combination of them, if several), or a row with None values for an
+        item without related items.
+
+        """
+        if not self._related:
+            return map(self._get, items)
+        return self._flattened_rows(items)
+
+    def _flattened_rows(self, items):
+        get = self._get
+        for item in items:
+            parts = [[get(item)]]
+            for get_related, get_values, empty in self._related:
+                parts.append(
+                    [get_values(i) for i in get_related(item)] or [empty])
+            for combination in itertools.product(*parts):
+                yield tuple(itertools.chain.from_iterable(combination))
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def layout(item_class, related=()):
+    """Return the export Layout for item_class, flattening related."""
+    key = (item_class, tuple(related))
+    result = _layouts.get(key)
+    if result is None:
+        result = Layout(item_class, related)
+        with _layouts_lock:
+            _layouts[key] = result
+    return result
+
+
+class Exporter(object):
+    """Base class of item exporters.
+
+    Exporters write the items given to write() in batches of 'batch_size'
+    rows, with the columns of the item class layout (see Layout). Items can
+    be any iterable of item_class instances (or their records, unless
+    related items are flattened), consumed as they are written.
+
+    Exporters are also context managers, closing the output on exit.
+
+    """
+
+    def __init__(self, item_class, related=(), batch_size=BATCH_SIZE):
+        super(Exporter, self).__init__()
+        self.layout = layout(item_class, related)
+        self.batch_size = batch_size
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, items):
+        """Write items, returning the number of rows written."""
+        rows = self.layout.rows(items)
+        written = 0
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.write_rows(batch)
+            written += len(batch)
+        self.count += written
+        return written
+
+    def write_rows(self, rows):
+        """Write a batch of rows (values tuples, in columns order)."""
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and close the output."""
+
+
+class FileExporter(Exporter):
+    """Base class of exporters writing to a text file (or file object)."""
+
+    newline = None
+
+    def __init__(self, item_class, output, related=(), batch_size=BATCH_SIZE):
+        super(FileExporter, self).__init__(
+            item_class, related=related, batch_size=batch_size)
+        self._owned = not hasattr(output, 'write')
+        if self._owned:
+            output = io.open(
+                output, 'w', encoding='utf-8', newline=self.newline)
+        self.output = output
+
+    def close(self):
+        if self._owned:
+            self.output.close()
+        else:
+            self.output.flush()
+
+
+class JSONLExporter(FileExporter):
+    """Write items as JSON lines, one object per row.
+
+    Values not supported by JSON are written as strings.
+
+    """
+
+    def __init__(self, item_class, output, related=(), batch_size=BATCH_SIZE):
+        super(JSONLExporter, self).__init__(
+            item_class, output, related=related, batch_size=batch_size)
+        self._encode = json.JSONEncoder(
+            ensure_ascii=False, separators=(',', ':'), default=str).encode
+
+    def write_rows(self, rows):
+        columns = self.layout.columns
+        encode = self._encode
+        self.output.write(''.join([
+            encode(dict(zip(columns, row))) + '\n' for row in rows]))
+
+
+class CSVExporter(FileExporter):
+    """Write items as CSV rows, after a header row (unless not 'header').
+
+    Extra keyword arguments are csv.writer format parameters.
+
+    """
+
+    newline = ''
+
+    def __init__(self, item_class, output, related=(), header=True,
+                 batch_size=BATCH_SIZE, **fmtparams):
+        super(CSVExporter, self).__init__(
+            item_class, output, related=related, batch_size=batch_size)
+        self._writer = csv.writer(self.output, **fmtparams)
+        if header:
+            self._writer.writerow(self.layout.columns)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+
+def _quote(name):
+    """Quote an SQL identifier."""
+    return '"%s"' % name.replace('"', '""')
+
+
+class SQLiteExporter(Exporter):
+    """Write items as rows of a SQLite table.
+
+    'database' is a filename or a sqlite3 connection. The table (named
+    after the item class, unless given) is created if it doesn't exist,
+    with a column per layout column, typed INTEGER or REAL for fields
+    coerced to int or float. Each batch is inserted in a transaction,
+    using executemany.
+
+    """
+
+    def __init__(self, item_class, database, table=None, related=(),
+                 batch_size=BATCH_SIZE):
+        super(SQLiteExporter, self).__init__(
+            item_class, related=related, batch_size=batch_size)
+        self._owned = not isinstance(database, sqlite3.Connection)
+        if self._owned:
+            database = sqlite3.connect(database)
+        self.db = database
+        self.table = table or item_class.__name__
+        columns = self.layout.columns
+        definitions = ', '.join(
+            ('%s %s' % (_quote(name), SQLITE_TYPES[coerce])
+             if coerce in SQLITE_TYPES else _quote(name))
+            for name, coerce in zip(columns, self.layout.coerce))
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (
+                _quote(self.table), definitions))
+        self._insert = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            _quote(self.table), ', '.join(_quote(name) for name in columns),
+            ', '.join('?' * len(columns)))
+
+    def write_rows(self, rows):
+        with self.db:
+            self.db.executemany(self._insert, rows)
+
+    def close(self):
+        if self._owned:
+            self.db.close()
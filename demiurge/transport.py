@@ -0,0 +1,458 @@
+# -*- coding:utf-8 -*-
+"""HTTP transport keeping persistent connections per host."""
+
+import gzip
+import io
+import re
+import threading
+import time
+import zlib
+from email.utils import mktime_tz, parsedate_tz
+from http.client import (
+    BadStatusLine, CannotSendRequest, HTTPConnection, HTTPSConnection)
+from urllib.parse import urlencode, urljoin, urlparse
+
+
+CHARSET_RE = re.compile(r'charset=["\']?([\w-]+)', re.I)
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+RETRY_CODES = (429, 500, 502, 503, 504)
+# request options (from PyQuery or the item Meta) a Session handles
+REQUEST_OPTIONS = ('method', 'headers', 'data', 'timeout', 'encoding')
+
+clock = getattr(time, 'monotonic', time.time)
+
+# errors raised when a kept-alive connection was closed by the server
+# before replying (RemoteDisconnected is a BadStatusLine); timeouts are not
+# retried, the server may still be processing the request
+STALE_CONNECTION_ERRORS = (
+    BadStatusLine, CannotSendRequest, ConnectionResetError, BrokenPipeError)
+
+
+class HTTPError(Exception):
+    """HTTP error response."""
+
+    def __init__(self, response):
+        super(HTTPError, self).__init__(
+            '%s %s: %s' % (response.status, response.reason, response.url))
+        self.response = response
+
+
+class Response(object):
+    """HTTP response, with decoded (if compressed) content.
+
+    'not_modified' is True if the content was reused from cache after a
+    conditional request; 'cache_entry' is the HTTP cache entry for the
+    content, if cached.
+
+    """
+
+    def __init__(self, url, status, reason, headers, content,
+                 not_modified=False, cache_entry=None):
+        super(Response, self).__init__()
+        self.url = url
+        self.status = status
+        self.reason = reason
+        # header names are lowercased
+        self.headers = headers
+        self.content = content
+        self.not_modified = not_modified
+        self.cache_entry = cache_entry
+
+    @property
+    def charset(self):
+        """Charset from Content-Type header, if specified."""
+        match = CHARSET_RE.search(self.headers.get('content-type', ''))
+        if match:
+            return match.group(1)
+        return None
+
+    @property
+    def text(self):
+        return self.content.decode(self.charset or 'utf-8', 'replace')
+
+
+def decode_content(content, encoding):
+    """Decode gzip or deflate encoded content."""
+    encoding = encoding.lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return gzip.GzipFile(fileobj=io.BytesIO(content)).read()
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(content)
+        except zlib.error:
+            # raw deflate stream, without zlib header
+            return zlib.decompress(content, -zlib.MAX_WBITS)
+    return content
+
+
+def retry_after(response):
+    """Return the seconds to wait given by Retry-After header, or None."""
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0, mktime_tz(date) - time.time())
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket, allowing 'rate' acquisitions per second.
+
+    Up to 'capacity' tokens can be accumulated (allowing bursts).
+
+    """
+
+    def __init__(self, rate, capacity=1, sleep=time.sleep):
+        super(TokenBucket, self).__init__()
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = clock()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+
+class Scheduler(object):
+    """Polite requests scheduler, per host.
+
+    Requests to each host are limited to 'rate' per second (allowing bursts
+    of up to 'burst' requests), and to 'max_in_flight' concurrent requests.
+    Responses with a status in 'retry_statuses' (429 and 5xx, by default)
+    are retried up to 'retries' times, waiting as requested by the
+    Retry-After header, or with exponential backoff otherwise ('backoff'
+    seconds, doubled on each retry, up to 'max_backoff'). If the server
+    asks to wait longer than 'max_retry_after' seconds (when set), the
+    response is not retried.
+
+    Set it as *scheduler* of a demiurge.Session.
+
+    """
+
+    def __init__(self, rate=None, burst=1, max_in_flight=None, retries=3,
+                 backoff=0.5, max_backoff=60, max_retry_after=None,
+                 retry_statuses=RETRY_CODES, sleep=time.sleep):
+        super(Scheduler, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = retry_statuses
+        self.sleep = sleep
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, netloc):
+        """Return the (token bucket, semaphore) for host."""
+        with self._lock:
+            host = self._hosts.get(netloc)
+            if host is None:
+                bucket = semaphore = None
+                if self.rate:
+                    bucket = TokenBucket(
+                        self.rate, capacity=self.burst, sleep=self.sleep)
+                if self.max_in_flight:
+                    semaphore = threading.Semaphore(self.max_in_flight)
+                host = self._hosts[netloc] = (bucket, semaphore)
+        return host
+
+    def delay(self, response, attempt):
+        """Return the seconds to wait before retrying a response.
+
+        Return None if the response should not be retried, as the server
+        asks to wait longer than max_retry_after.
+
+        """
+        delay = retry_after(response)
+        if delay is None:
+            return min(self.backoff * (2 ** attempt), self.max_backoff)
+        if self.max_retry_after is not None and delay > self.max_retry_after:
+            return None
+        return delay
+
+    def send(self, url, send):
+        """Return the response from calling send() for url, politely."""
+        bucket, semaphore = self._host(urlparse(url).netloc)
+        attempt = 0
+        while True:
+            if semaphore is not None:
+                semaphore.acquire()
+            try:
+                if bucket is not None:
+                    bucket.acquire()
+                response = send()
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+            if (response.status not in self.retry_statuses or
+                    attempt >= self.retries):
+                return response
+            delay = self.delay(response, attempt)
+            if delay is None:
+                return response
+            self.sleep(delay)
+            attempt += 1
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of idle connections, per host."""
+
+    def __init__(self, maxsize=10, timeout=None):
+        super(ConnectionPool, self).__init__()
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.created = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, netloc):
+        """Return an idle connection to host, or a new one.
+
+        Return a (connection, reused) tuple.
+
+        """
+        key = (scheme, netloc)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+            self.created += 1
+        if scheme == 'https':
+            connection = HTTPSConnection(netloc, timeout=self.timeout)
+        else:
+            connection = HTTPConnection(netloc, timeout=self.timeout)
+        return connection, False
+
+    def put(self, scheme, netloc, connection):
+        """Return a connection to the pool, for reuse."""
+        key = (scheme, netloc)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+class Session(object):
+    """HTTP session keeping pooled persistent connections.
+
+    Connections are kept alive and reused for requests to the same host (up
+    to 'maxsize' idle connections per host). Responses are transparently
+    decompressed (gzip and deflate encodings are supported).
+
+    A session can be used as PyQuery opener; set it as *transport* in an
+    item Meta (the same session can be shared between items).
+
+    If a demiurge.cache.HTTPCache is given as 'cache', GET requests for
+    cached URLs are conditional, reusing the cached content if the server
+    replies the document was not modified. If a Scheduler is given as
+    'scheduler', requests are rate limited (and retried) per host.
+
+    """
+
+    def __init__(self, timeout=30, maxsize=10, headers=None, max_redirects=5,
+                 cache=None, scheduler=None):
+        super(Session, self).__init__()
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.max_redirects = max_redirects
+        self.headers = {
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        }
+        if headers:
+            self.headers.update(headers)
+        self.pool = ConnectionPool(maxsize=maxsize, timeout=timeout)
+
+    def _send(self, method, url, headers, body, timeout=None):
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        if timeout is None:
+            timeout = self.timeout
+
+        while True:
+            connection, reused = self.pool.get(parsed.scheme, parsed.netloc)
+            try:
+                # pooled connections may have been used with another timeout
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused:
+                    # retry using a new connection
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self.pool.put(parsed.scheme, parsed.netloc, connection)
+
+        response_headers = dict(
+            (name.lower(), value) for name, value in response.getheaders())
+        encoding = response_headers.get('content-encoding')
+        if encoding:
+            content = decode_content(content, encoding)
+        return Response(
+            url, response.status, response.reason, response_headers, content)
+
+    def _send_cached(self, method, url, headers, body, timeout=None):
+        if self.cache is None or method != 'GET':
+            return self._send(method, url, headers, body, timeout)
+
+        validators = self.cache.validators(url)
+        if validators:
+            headers = dict(headers, **validators)
+        response = self._send(method, url, headers, body, timeout)
+        if response.status == 304 and validators:
+            entry = self.cache.get(url)
+            if entry is not None:
+                self.cache.hits += 1
+                self.cache.touch(url)
+                return Response(
+                    url, entry['status'], 'OK', entry['headers'],
+                    entry['content'], not_modified=True, cache_entry=entry)
+        self.cache.misses += 1
+        if response.status == 200:
+            response.cache_entry = self.cache.store(
+                url, response.status, response.headers, response.content)
+        return response
+
+    def request(self, url, method='GET', headers=None, data=None,
+                timeout=None):
+        """Make a request, following redirects; return the Response.
+
+        'data' is sent as form data (or as query string, for GET requests,
+        in which case bytes data must be ASCII).
+        'timeout' (in seconds) overrides the session timeout for this
+        request. Raise HTTPError for error responses.
+
+        """
+        method = method.upper()
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+        body = None
+        if data:
+            if not isinstance(data, (str, bytes)):
+                data = urlencode(data)
+            if method == 'GET':
+                if isinstance(data, bytes):
+                    data = data.decode('ascii')
+                url += ('&' if '?' in url else '?') + data
+            else:
+                body = data
+                request_headers.setdefault(
+                    'Content-Type', 'application/x-www-form-urlencoded')
+
+        for i in range(self.max_redirects + 1):
+            if self.scheduler is not None:
+                response = self.scheduler.send(
+                    url, lambda: self._send_cached(
+                        method, url, request_headers, body, timeout))
+            else:
+                response = self._send_cached(
+                    method, url, request_headers, body, timeout)
+            location = response.headers.get('location')
+            if response.status not in REDIRECT_CODES or not location:
+                break
+            url = urljoin(url, location)
+            if response.status == 303:
+                method, body = 'GET', None
+
+        if response.status >= 400:
+            raise HTTPError(response)
+        return response
+
+    def _request_document(self, url, kwargs):
+        unsupported = sorted(set(kwargs).difference(REQUEST_OPTIONS))
+        if unsupported:
+            raise ValueError(
+                'Session does not support request options: %s' %
+                ', '.join(unsupported))
+        response = self.request(
+            url, method=kwargs.get('method', 'GET'),
+            headers=kwargs.get('headers'), data=kwargs.get('data'),
+            timeout=kwargs.get('timeout'))
+        html = response.content
+        encoding = kwargs.get('encoding') or response.charset
+        if encoding:
+            html = html.decode(encoding, 'replace')
+        return response, html
+
+    def open(self, url, kwargs):
+        """Return the document at url, as PyQuery url_opener does.
+
+        The document is returned as text if the charset is known, otherwise
+        as bytes (letting the parser detect the encoding). Raise ValueError
+        for request options not supported (other than REQUEST_OPTIONS).
+
+        """
+        return self._request_document(url, kwargs)[1]
+
+    def open_document(self, url, kwargs, parse, key=None):
+        """Return the document at url, parsed calling parse(html).
+
+        If the response was not modified since cached, the document parsed
+        before (using the same 'key') is reused, when available.
+
+        """
+        response, html = self._request_document(url, kwargs)
+        entry = response.cache_entry
+        if entry is None:
+            return parse(html)
+
+        document_key = self.cache.document_key(entry, key)
+        document = self.cache.documents.get(document_key)
+        if document is None:
+            document = parse(html)
+            self.cache.documents.set(document_key, document)
+        return document
+
+    def __call__(self, url, **kwargs):
+        return self.open(url, kwargs)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.pool.clear()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Local stand-in HTTP server for tests."""
+
+import threading
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, do not delay the body
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server.stub
+        path = self.path.split('?', 1)[0]
+        with server.lock:
+            server.requests.append(
+                (self.path, dict(self.headers.items()), self.client_address))
+        route = server.routes.get(path)
+        if route is None:
+            status, headers, body = 404, {}, 'Not found'
+        elif callable(route):
+            status, headers, body = route(self)
+        else:
+            status, headers, body = route
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        headers = dict(headers)
+        headers.setdefault('Content-Type', 'text/html; charset=utf-8')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    # concurrent clients (thread pools) connecting at once
+    request_queue_size = 64
+
+
+class StubServer(object):
+    """HTTP server running in a thread, serving the configured routes.
+
+    A route is a (status, headers, body) tuple, or a callable receiving
+    the request handler and returning one.
+
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    def add(self, path, body, status=200, headers=None):
+        self.routes[path] = (status, headers or {}, body)
+
+    def url(self, path=''):
+        host, port = self._server.server_address
+        return 'http://%s:%d%s' % (host, port, path)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def requested(self, path):
+        """Return how many times path was requested."""
+        with self.lock:
+            return len([r for r in self.requests if r[0] == path])
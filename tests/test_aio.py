@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+import unittest
+
+import demiurge
+from demiurge import aio
+from tests.httpserver import StubServer
+
+
+HTML_INDEX = """
+<html>
+    <body>
+        <h1>Index</h1>
+        <ul>
+            <li><a class="link" href="/detail/1">First</a></li>
+            <li><a class="link" href="/detail/2">Second</a></li>
+            <li><a class="link" href="/detail/3">Third</a></li>
+        </ul>
+    </body>
+</html>
+"""
+
+HTML_DETAIL = """
+<html>
+    <body>
+        <p class="detail"><strong>Name:</strong> Detail %d</p>
+    </body>
+</html>
+"""
+
+
+class Detail(demiurge.Item):
+    label = demiurge.TextField(selector='strong')
+    value = demiurge.TextField()
+
+    class Meta:
+        selector = 'p.detail'
+
+
+class Entry(demiurge.Item):
+    name = demiurge.TextField(selector='a')
+    details = demiurge.RelatedItem(Detail, selector='a', attr='href')
+    inner = demiurge.RelatedItem('self')
+
+    class Meta:
+        selector = 'li'
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncItemTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(AsyncItemTestCase, self).setUp()
+        self.server = StubServer()
+        self.server.add('/', HTML_INDEX)
+        for i in range(1, 4):
+            self.server.add('/detail/%d' % i, HTML_DETAIL % i)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        Entry._meta.base_url = self.server.url()
+        Detail._meta.base_url = self.server.url()
+        self.transport = aio.ThreadedTransport(concurrency=5)
+        self.addCleanup(self.transport.close)
+
+    def test_aone(self):
+        entry = run(Entry.aone('/', index=1, transport=self.transport))
+
+        self.assertEqual(entry.name, 'Second')
+
+    def test_aone_not_found(self):
+        with self.assertRaises(demiurge.ItemDoesNotExist):
+            run(Entry.aone('/', index=5, transport=self.transport))
+
+    def test_aall(self):
+        entries = run(Entry.aall('/', transport=self.transport))
+
+        self.assertEqual(
+            [e.name for e in entries], ['First', 'Second', 'Third'])
+
+    def test_aall_default_transport(self):
+        entries = run(Entry.aall('/'))
+
+        self.assertEqual(len(entries), 3)
+
+    def test_meta_transport(self):
+        transport = aio.ThreadedTransport(
+            opener=lambda url, kwargs: HTML_DETAIL % 7)
+        self.addCleanup(transport.close)
+        Detail._meta.async_transport = transport
+        self.addCleanup(setattr, Detail._meta, 'async_transport', None)
+
+        details = run(Detail.aall('/anything'))
+
+        self.assertEqual(details[0].value, 'Name: Detail 7')
+        self.assertEqual(self.server.requests, [])
+
+    def test_arelated(self):
+        async def crawl():
+            entries = await Entry.aall('/', transport=self.transport)
+            details = await asyncio.gather(*[
+                e.arelated('details', transport=self.transport)
+                for e in entries])
+            return entries, details
+
+        entries, details = run(crawl())
+
+        self.assertEqual(
+            [d[0].value for d in details],
+            ['Name: Detail 1', 'Name: Detail 2', 'Name: Detail 3'])
+        # resolved values are cached in the instance
+        self.assertIs(entries[0].details, details[0])
+        self.assertEqual(self.server.requested('/detail/1'), 1)
+
+    def test_arelated_from_item_html(self):
+        entry = run(Entry.aone('/', transport=self.transport))
+
+        inner = run(entry.arelated('inner', transport=self.transport))
+        self.assertEqual([i.name for i in inner], ['First'])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_concurrency_limit(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def slow(handler):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            return 200, {}, HTML_DETAIL % 0
+
+        self.server.routes['/slow'] = slow
+        transport = aio.ThreadedTransport(concurrency=2)
+        self.addCleanup(transport.close)
+
+        async def fetch_many():
+            return await asyncio.gather(*[
+                Detail.aall('/slow', transport=transport)
+                for i in range(6)])
+
+        results = run(fetch_many())
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(state['max'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
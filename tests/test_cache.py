@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from mock import patch
+
+import demiurge
+from demiurge.cache import DocumentCache, LRUCache
+
+
+HTML_INDEX = """
+<html>
+    <body>
+        <p class="entry"><a class="link" href="/links">First</a></p>
+        <p class="entry"><a class="link" href="/links">Second</a></p>
+    </body>
+</html>
+"""
+
+HTML_LINKS = """
+<html>
+    <body><a class="link" href="http://github.com/matiasb">Link</a></body>
+</html>
+"""
+
+
+class Link(demiurge.Item):
+    label = demiurge.TextField()
+
+    class Meta:
+        selector = 'a.link'
+        base_url = 'http://localhost'
+        cache = DocumentCache(maxsize=10)
+
+
+class Entry(demiurge.Item):
+    name = demiurge.TextField(selector='a')
+    links = demiurge.RelatedItem(Link, selector='a', attr='href')
+
+    class Meta:
+        selector = 'p.entry'
+        base_url = 'http://localhost'
+        cache = DocumentCache(maxsize=10, raw_maxsize=10)
+
+
+class EntryLinks(demiurge.Item):
+    """Another item sharing the Entry documents cache."""
+    label = demiurge.TextField(selector='a.link')
+
+    class Meta:
+        selector = 'p.entry'
+        base_url = 'http://localhost'
+        cache = Entry._meta.cache
+
+
+class UncachedEntry(demiurge.Item):
+    name = demiurge.TextField(selector='a')
+
+    class Meta:
+        selector = 'p.entry'
+        base_url = 'http://localhost'
+        cache = False
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = LRUCache()
+        cache.set('key', 'value')
+
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.stats(), {
+            'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1})
+
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # 'a' is now the most recently used
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=10)
+        with patch('demiurge.cache.clock', return_value=100):
+            cache.set('a', 1)
+            cache.set('b', 2, ttl=60)
+        with patch('demiurge.cache.clock', return_value=109):
+            self.assertEqual(cache.get('a'), 1)
+        with patch('demiurge.cache.clock', return_value=110):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_clear(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.clear()
+
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_matching(self):
+        cache = LRUCache()
+        for key, value in (('a', 1), ('b', 2), ('c', 3)):
+            cache.set(key, value)
+
+        cache.delete_matching(lambda value: value % 2)
+
+        self.assertEqual(len(cache), 1)
+        self.assertIn('b', cache)
+
+
+class DocumentCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(DocumentCacheTestCase, self).setUp()
+        patcher = patch('demiurge.demiurge.pyquery.pyquery.url_opener')
+        self.addCleanup(patcher.stop)
+        self.mock_opener = patcher.start()
+        self.mock_opener.return_value = HTML_INDEX
+        for item in (Entry, Link):
+            self.addCleanup(item._meta.cache.clear)
+
+    def test_one_with_index_fetches_once(self):
+        hits = Entry._meta.cache.documents.hits
+        first = Entry.one(index=0)
+        second = Entry.one(index=1)
+
+        self.assertEqual(first.name, 'First')
+        self.assertEqual(second.name, 'Second')
+        self.assertEqual(self.mock_opener.call_count, 1)
+        stats = Entry._meta.cache.stats()
+        self.assertEqual(stats['documents']['hits'], hits + 1)
+
+    def test_cache_shared_between_items(self):
+        Entry.all()
+        links = EntryLinks.all()
+
+        self.assertEqual(len(links), 2)
+        self.assertEqual(self.mock_opener.call_count, 1)
+
+    def test_different_urls(self):
+        Entry.all('/a')
+        Entry.all('/b')
+
+        self.assertEqual(self.mock_opener.call_count, 2)
+
+    def test_related_items_fetched_once(self):
+        entries = Entry.all()
+        self.mock_opener.return_value = HTML_LINKS
+
+        links = [entry.links for entry in entries]
+
+        self.assertEqual(links[0][0].label, 'Link')
+        self.assertEqual(links[1][0].label, 'Link')
+        self.assertEqual(self.mock_opener.call_count, 2)
+
+    def test_related_items_reuse_fetched_document(self):
+        self.mock_opener.return_value = HTML_LINKS
+        demiurge.Document.fetch(
+            'http://localhost/links', cache=Link._meta.cache)
+        self.mock_opener.return_value = HTML_INDEX
+        entries = Entry.all()
+
+        self.assertEqual(entries[0].links[0].label, 'Link')
+        self.assertEqual(self.mock_opener.call_count, 2)
+
+    def test_item_document_cached(self):
+        document = Entry.document()
+        entries = document.all(Entry)
+        links = EntryLinks.all()
+
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(len(links), 2)
+        self.assertEqual(self.mock_opener.call_count, 1)
+
+    def test_flush_cache(self):
+        Entry.all()
+        Entry.flush_cache()
+        Entry.all()
+
+        self.assertEqual(self.mock_opener.call_count, 2)
+
+    def test_flush_cache_shared(self):
+        Entry.all('/a')
+        EntryLinks.all('/b')
+
+        Entry.flush_cache()
+
+        self.assertEqual(len(Entry._meta.cache.documents), 1)
+        self.assertEqual(len(Entry._meta.cache.raw), 1)
+        Entry.all('/a')
+        EntryLinks.all('/b')
+        self.assertEqual(self.mock_opener.call_count, 3)
+
+    def test_flush_default_cache(self):
+        class DefaultCacheEntry(demiurge.Item):
+            class Meta:
+                selector = 'p.entry'
+                base_url = 'http://localhost'
+                cache = True
+
+        class OtherDefaultCacheEntry(DefaultCacheEntry):
+            class Meta:
+                selector = 'p.entry'
+                base_url = 'http://localhost'
+                cache = True
+        self.addCleanup(demiurge.cache.default_cache.clear)
+        DefaultCacheEntry.all('/default')
+        OtherDefaultCacheEntry.all('/other')
+
+        DefaultCacheEntry.flush_cache()
+        DefaultCacheEntry.all('/default')
+        OtherDefaultCacheEntry.all('/other')
+
+        self.assertEqual(self.mock_opener.call_count, 3)
+
+    def test_cache_disabled(self):
+        self.assertIsNone(UncachedEntry._meta.cache)
+        UncachedEntry.all()
+        UncachedEntry.all()
+
+        self.assertEqual(self.mock_opener.call_count, 2)
+
+    def test_cache_not_passed_to_opener(self):
+        Entry.all()
+
+        self.mock_opener.assert_called_once_with('http://localhost', {})
+
+    def test_raw_cache(self):
+        raw_stats = Entry._meta.cache.raw.stats()
+        Entry.all()
+        # parsed document evicted, raw document still cached
+        Entry._meta.cache.documents.clear()
+        entries = Entry.all()
+
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(self.mock_opener.call_count, 1)
+        stats = Entry._meta.cache.stats()['raw']
+        self.assertEqual(stats['hits'], raw_stats['hits'] + 1)
+        self.assertEqual(stats['misses'], raw_stats['misses'] + 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_default_cache(self):
+        class DefaultCacheEntry(demiurge.Item):
+            class Meta:
+                cache = True
+
+        self.assertIs(
+            DefaultCacheEntry._meta.cache, demiurge.cache.default_cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
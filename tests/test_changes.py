@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+import demiurge
+from demiurge import changes
+
+
+def rows_page(*rows):
+    return '<html><body><table>%s</table></body></html>' % ''.join(
+        '<tr><td>%s</td><td>%s</td></tr>' % row for row in rows)
+
+
+class Row(demiurge.Item):
+    name = demiurge.TextField(selector='td:eq(0)')
+    value = demiurge.TextField(selector='td:eq(1)', coerce=int)
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = 'tr'
+
+
+class StateStoreTestsMixin(object):
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def test_set_and_get(self):
+        store = self.make_store()
+
+        self.assertIsNone(store.get('page'))
+        store.set('page', 'abc', ['x', 'y', 'x'])
+        store.set('other', 'def', [])
+
+        self.assertEqual(store.get('page'), ('abc', frozenset(['x', 'y'])))
+        self.assertEqual(store.get('other'), ('def', frozenset()))
+        self.assertEqual(len(store), 2)
+
+    def test_set_replaces_snapshot(self):
+        store = self.make_store()
+        store.set('page', 'abc', ['x', 'y'])
+
+        store.set('page', 'def', ['z'])
+
+        self.assertEqual(store.get('page'), ('def', frozenset(['z'])))
+
+    def test_delete_and_clear(self):
+        store = self.make_store()
+        store.set('page', 'abc', ['x'])
+        store.set('other', 'def', ['y'])
+
+        store.delete('page')
+        self.assertIsNone(store.get('page'))
+        self.assertEqual(len(store), 1)
+        store.clear()
+        self.assertEqual(len(store), 0)
+
+
+class MemoryStateStoreTestCase(StateStoreTestsMixin, unittest.TestCase):
+
+    def make_store(self):
+        return demiurge.MemoryStateStore()
+
+
+class SQLiteStateStoreTestCase(StateStoreTestsMixin, unittest.TestCase):
+
+    def make_store(self):
+        store = demiurge.SQLiteStateStore()
+        self.addCleanup(store.close)
+        return store
+
+    def test_persistent(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, 'state.sqlite')
+        store = demiurge.SQLiteStateStore(path)
+        store.set('page', 'abc', ['x', 'y'])
+        store.close()
+
+        store = demiurge.SQLiteStateStore(path)
+        self.addCleanup(store.close)
+        self.assertEqual(store.get('page'), ('abc', frozenset(['x', 'y'])))
+
+
+class ChangeDetectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ChangeDetectionTestCase, self).setUp()
+        patcher = patch('demiurge.demiurge.pyquery.pyquery.url_opener')
+        self.addCleanup(patcher.stop)
+        self.mock_opener = patcher.start()
+        self.mock_opener.return_value = rows_page(('a', 1), ('b', 2))
+        self.store = demiurge.MemoryStateStore()
+
+    def changed(self, path=''):
+        return [(i.name, i.value)
+                for i in Row.iter_changed(path, store=self.store)]
+
+    def test_iter_changed(self):
+        self.assertEqual(self.changed(), [('a', 1), ('b', 2)])
+        self.assertEqual(self.changed(), [])
+
+        self.mock_opener.return_value = rows_page(('a', 1), ('b', 3), ('c', 4))
+        self.assertEqual(self.changed(), [('b', 3), ('c', 4)])
+        self.assertEqual(self.changed(), [])
+
+    def test_unchanged_body_not_parsed(self):
+        self.changed()
+
+        with patch.object(Row, '_select') as mock_select:
+            self.assertEqual(self.changed(), [])
+        self.assertFalse(mock_select.called)
+
+    def test_removed_rows(self):
+        self.changed()
+        self.mock_opener.return_value = rows_page(('b', 2))
+        self.assertEqual(self.changed(), [])
+
+        # a row coming back is new again
+        self.mock_opener.return_value = rows_page(('a', 1), ('b', 2))
+        self.assertEqual(self.changed(), [('a', 1)])
+
+    def test_snapshots_by_page(self):
+        self.changed('/first')
+
+        self.assertEqual(self.changed('/second'), [('a', 1), ('b', 2)])
+        self.assertEqual(len(self.store), 2)
+
+    def test_snapshot_saved_when_consumed(self):
+        items = Row.iter_changed(store=self.store)
+        next(items)
+        items.close()
+
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.changed(), [('a', 1), ('b', 2)])
+
+    def test_all_if_changed(self):
+        items = Row.all_if_changed(store=self.store)
+
+        self.assertEqual([i.name for i in items], ['a', 'b'])
+        self.assertIsNone(Row.all_if_changed(store=self.store))
+        self.mock_opener.return_value = rows_page(('a', 1), ('b', 3))
+        items = Row.all_if_changed(store=self.store)
+        self.assertEqual([i.value for i in items], [1, 3])
+        # snapshot is shared with iter_changed
+        self.assertEqual(self.changed(), [])
+
+    def test_meta_state(self):
+        class StatefulRow(Row):
+            class Meta:
+                base_url = 'http://localhost'
+                selector = 'tr'
+                state = self.store
+
+        self.assertEqual(len(list(StatefulRow.iter_changed())), 2)
+        self.assertEqual(len(self.store), 1)
+        # state is not passed to the opener
+        self.mock_opener.assert_called_once_with('http://localhost', {})
+
+    def test_default_store(self):
+        self.addCleanup(changes.default_store.clear)
+
+        self.assertEqual(len(list(Row.iter_changed('/default'))), 2)
+        self.assertEqual(list(Row.iter_changed('/default')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
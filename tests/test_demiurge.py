@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import array
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import threading
 import unittest
 
+import pyquery
 from mock import patch
 
 import demiurge
@@ -112,6 +120,88 @@ class TestInnerItem(demiurge.Item):
         selector = "div.section"
 
 
+class TestLazyItem(demiurge.Item):
+    label = demiurge.TextField(selector='.link')
+    url = demiurge.AttributeValueField(selector='.link', attr='href')
+
+    def clean_label(self, value):
+        return value.upper()
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = "p.p_with_link"
+        lazy = True
+
+
+class TestDetachedItem(TestItem):
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = "p.p_with_link"
+        detach = True
+        keep_html = True
+
+
+class TestPaginatedItem(demiurge.Item):
+    title = demiurge.TextField(selector='h1')
+
+    class Meta:
+        base_url = 'http://localhost/index'
+        selector = 'body'
+        next_page = 'a.next'
+
+
+class TestTreeLink(demiurge.Item):
+    name = demiurge.TextField()
+    target = demiurge.RelatedItem('self', attr='href')
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = 'a.node'
+
+
+def tree_page(*paths):
+    return '<html><body>%s</body></html>' % ''.join(
+        '<a class="node" href="%s">%s</a>' % (path, path) for path in paths)
+
+
+TREE_PAGES = {
+    'http://localhost': tree_page('/a', '/b'),
+    'http://localhost/a': tree_page('/b', '/', '/c#top'),
+    'http://localhost/b': tree_page('/a'),
+    'http://localhost/c': tree_page(),
+}
+
+
+class TestLxmlItem(TestItem):
+    title = demiurge.TextField()
+    inner = demiurge.RelatedItem(TestItem)
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = "p.p_with_link"
+        backend = 'lxml'
+
+
+class TestSharedSelectorItem(demiurge.Item):
+    label = demiurge.TextField(selector='.link')
+    url = demiurge.AttributeValueField(selector='.link', attr='href')
+    following = demiurge.RelatedItem(TestItem, selector='.link', attr='href')
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = "p.p_with_link"
+
+
+class TestXMLItem(demiurge.Item):
+    name = demiurge.TextField(selector='name')
+    id = demiurge.AttributeValueField(attr='id')
+
+    class Meta:
+        selector = 'entry[id]'
+        parser = 'xml'
+
+
 class TestDemiurge(unittest.TestCase):
 
     def setUp(self):
@@ -151,6 +241,467 @@ class TestDemiurge(unittest.TestCase):
         self.assertEqual(items[1].label, 'Another link.')
         self.assertEqual(items[1].url, 'http://github.com/matiasb/demiurge')
 
+    def test_iter_all(self):
+        items = TestItem.iter_all()
+
+        self.assertFalse(self.mock_opener.called)
+        first = next(items)
+        self.assertEqual(first.label, 'Link text.')
+        self.assertEqual(
+            [i.url for i in items], ['http://github.com/matiasb/demiurge'])
+        self.mock_opener.assert_called_once_with(
+            'http://localhost', {'extra_attribute': 'value'})
+
+    def test_document_shared_by_items(self):
+        document = demiurge.Document.fetch('http://localhost')
+        items = document.all(TestItem)
+        paragraphs = document.all(TestItemWithClean)
+        page = document.one(TestItemWithFieldCoercion)
+
+        self.assertEqual(
+            [i.label for i in items], ['Link text.', 'Another link.'])
+        self.assertEqual(
+            [i.label for i in paragraphs], ['LINK TEXT.', 'ANOTHER LINK.'])
+        self.assertEqual(page.label, 2)
+        self.mock_opener.assert_called_once_with('http://localhost', {})
+
+    def test_document_one_missing(self):
+        document = demiurge.Document.parse(HTML_SAMPLE)
+
+        with self.assertRaises(demiurge.ItemDoesNotExist):
+            document.one(TestItem, index=2)
+
+    def test_document_iter_all(self):
+        document = demiurge.Document.parse(HTML_SAMPLE)
+
+        self.assertEqual(
+            [i.url for i in document.iter_all(TestItem)],
+            ['http://github.com/matiasb',
+             'http://github.com/matiasb/demiurge'])
+        self.assertIsNone(document.url)
+
+    def test_item_document(self):
+        document = TestItem.document()
+
+        self.assertEqual(document.url, 'http://localhost')
+        self.assertEqual(len(document.all(TestItemWithClean)), 2)
+        self.mock_opener.assert_called_once_with(
+            'http://localhost', {'extra_attribute': 'value'})
+
+    def test_iter_from(self):
+        items = TestItem.iter_from(HTML_SAMPLE)
+
+        self.assertEqual(
+            [i.label for i in items], ['Link text.', 'Another link.'])
+
+    def test_iterparse(self):
+        source = io.BytesIO(HTML_SAMPLE.encode('utf-8'))
+        items = TestItem.iterparse(source)
+
+        self.assertEqual(
+            [(i.label, i.url) for i in items],
+            [(i.label, i.url) for i in TestItem.all_from(HTML_SAMPLE)])
+
+    def test_iterparse_clears_processed_elements(self):
+        rows = ''.join(
+            '<tr><td><a class="link" href="/%d">%d</a></td></tr>' % (i, i)
+            for i in range(100))
+        html = '<html><body><table>%s</table></body></html>' % rows
+
+        class RowItem(demiurge.Item):
+            label = demiurge.TextField(selector='a')
+
+            class Meta:
+                selector = 'tr'
+
+        seen = []
+        for item in RowItem.iterparse(io.BytesIO(html.encode('utf-8'))):
+            seen.append(item.label)
+            # only the (cleared) previous row is kept
+            previous = item._pq[0].getprevious()
+            if previous is not None:
+                self.assertEqual(len(previous), 0)
+                self.assertIsNone(previous.getprevious())
+        self.assertEqual(seen, [str(i) for i in range(100)])
+
+    def test_iterparse_xml(self):
+        xml = (b'<feed><entry id="1"><name>One</name></entry>'
+               b'<entry><name>No id</name></entry>'
+               b'<entry id="2"><name>Two</name></entry></feed>')
+
+        items = TestXMLItem.iterparse(io.BytesIO(xml))
+
+        self.assertEqual(
+            [(i.id, i.name) for i in items], [('1', 'One'), ('2', 'Two')])
+
+    def test_iterparse_leading_comment(self):
+        html = ('<!-- saved from url=(0022)http://localhost/ -->\n' +
+                HTML_SAMPLE)
+        xml = (b'<?xml version="1.0" encoding="utf-8"?>\n'
+               b'<!-- dump --><?generator test?>'
+               b'<feed><entry id="1"><name>One</name></entry>'
+               b'<entry id="2"><name>Two</name></entry></feed>')
+
+        items = TestItem.iterparse(io.BytesIO(html.encode('utf-8')))
+        self.assertEqual(
+            [i.label for i in items], ['Link text.', 'Another link.'])
+        items = TestXMLItem.iterparse(io.BytesIO(xml))
+        self.assertEqual(
+            [(i.id, i.name) for i in items], [('1', 'One'), ('2', 'Two')])
+
+    def test_iterparse_complex_selector(self):
+        class TableItem(demiurge.Item):
+            class Meta:
+                selector = 'table tr:gt(0)'
+
+        with self.assertRaises(ValueError):
+            list(TableItem.iterparse(io.BytesIO(b'<html></html>')))
+
+    def test_all_from_bytes(self):
+        data = HTML_SAMPLE.encode('utf-8')
+        expected = [(i.label, i.url) for i in TestItem.all_from(HTML_SAMPLE)]
+
+        for source in (data, bytearray(data), memoryview(data)):
+            items = TestItem.all_from_bytes(source)
+            self.assertEqual([(i.label, i.url) for i in items], expected)
+        self.assertEqual(TestItem.all_from_bytes(b''), [])
+
+    def test_all_from_bytes_meta_charset(self):
+        html = ('<html><head><meta charset="windows-1252"></head><body>'
+                '<p class="p_with_link"><a class="link" href="/">Caf\xe9</a>'
+                '</p></body></html>')
+        data = html.encode('cp1252')
+
+        self.assertEqual(TestItem.all_from_bytes(data)[0].label, 'Caf\xe9')
+        # an explicit encoding wins
+        self.assertNotEqual(
+            TestItem.all_from_bytes(data, encoding='utf-8')[0].label,
+            'Caf\xe9')
+
+    def test_all_from_bytes_xml(self):
+        xml = (b'<?xml version="1.0" encoding="iso-8859-1"?>'
+               b'<feed><entry id="1"><name>Caf\xe9</name></entry>'
+               b'<entry><name>No id</name></entry></feed>')
+
+        items = TestXMLItem.all_from_bytes(xml)
+
+        self.assertEqual([(i.id, i.name) for i in items], [('1', 'Caf\xe9')])
+
+    def test_all_from_file(self):
+        data = HTML_SAMPLE.encode('utf-8')
+
+        class Stream(object):
+            # not seekable, fed to the parser in chunks
+            def __init__(self):
+                self.source = io.BytesIO(data)
+
+            def read(self, size):
+                return self.source.read(min(size, 100))
+
+        for source in (io.BytesIO(data), Stream()):
+            items = TestItem.all_from_file(source)
+            self.assertEqual(
+                [i.label for i in items], ['Link text.', 'Another link.'])
+
+    def test_all_from_path(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filename = os.path.join(tempdir, 'sample.html')
+        with open(filename, 'wb') as f:
+            f.write(HTML_SAMPLE.encode('utf-8'))
+        empty = os.path.join(tempdir, 'empty.html')
+        open(empty, 'wb').close()
+
+        for mapped in (False, True):
+            items = TestItem.all_from_path(filename, mmap=mapped)
+            self.assertEqual(
+                [i.url for i in items],
+                ['http://github.com/matiasb',
+                 'http://github.com/matiasb/demiurge'])
+            self.assertEqual(TestItem.all_from_path(empty, mmap=mapped), [])
+
+        document = demiurge.Document.parse_path(filename, mmap=True)
+        self.assertEqual(document.one(TestItem, 1).label, 'Another link.')
+
+    def test_detect_encoding(self):
+        detect = demiurge.demiurge.detect_encoding
+
+        self.assertEqual(detect(b'\xef\xbb\xbf<html></html>'), 'utf-8')
+        self.assertEqual(detect(b'\xff\xfe<\x00'), 'utf-16')
+        self.assertEqual(detect(
+            b'<meta http-equiv="Content-Type" '
+            b'content="text/html; charset=ISO-8859-1">'), 'ISO-8859-1')
+        self.assertEqual(detect(b"<META CHARSET='Shift_JIS'>"), 'Shift_JIS')
+        self.assertIsNone(detect(b'<meta charset="unknown-charset">'))
+        self.assertIsNone(detect(b'<html><body>charset=utf-8</body></html>'))
+
+    def test_as_record(self):
+        item = TestItemWithFieldCoercion.one()
+
+        self.assertEqual(item.as_record(), {'label': 2, 'url': True})
+
+    def test_records_from(self):
+        records = TestItem.records_from(HTML_SAMPLE)
+
+        self.assertEqual(len(records), 2)
+        record = records[0]
+        self.assertIsInstance(record, demiurge.Record)
+        self.assertEqual(type(record).__name__, 'TestItemRecord')
+        self.assertEqual(record.label, 'Link text.')
+        self.assertEqual(record.url, 'http://github.com/matiasb')
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertFalse(hasattr(record, 'html'))
+        self.assertEqual(
+            record.as_record(),
+            {'label': 'Link text.', 'url': 'http://github.com/matiasb'})
+
+    def test_record_class_per_item(self):
+        record_class = TestItem.record_class()
+
+        self.assertIs(TestItem.record_class(), record_class)
+        self.assertIsNot(TestDetachedItem.record_class(), record_class)
+        self.assertEqual(record_class.__slots__, ('label', 'url'))
+
+    def test_detach_meta(self):
+        items = TestDetachedItem.all()
+        item = TestDetachedItem.one(index=1)
+
+        self.assertEqual(items[1], item)
+        self.assertEqual(item.label, 'Another link.')
+        self.assertIn('Another link.', item.html)
+        self.assertEqual(
+            repr(items[0]),
+            "TestDetachedItemRecord(label='Link text.', "
+            "url='http://github.com/matiasb', html=%r)" % items[0].html)
+
+    def test_record_hash(self):
+        records = TestItem.records_from(HTML_SAMPLE)
+        again = TestItem.records_from(HTML_SAMPLE)
+
+        self.assertEqual(hash(records[0]), hash(again[0]))
+        self.assertEqual(len(set(records + again)), 2)
+        self.assertEqual({records[0]: 'first'}[again[0]], 'first')
+
+    def test_record_pickle(self):
+        record = TestItem.records_from(HTML_SAMPLE)[0]
+
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_columns_from(self):
+        columns = TestItemWithClean.columns_from(HTML_SAMPLE)
+
+        self.assertEqual(columns, {'label': ['LINK TEXT.', 'ANOTHER LINK.']})
+
+    def test_columns_from_numeric(self):
+        html = '<div>%s</div>' % ''.join(
+            '<p><span class="n">%d</span><span class="f">%d.5</span></p>' % (
+                i, i) for i in range(3))
+
+        class NumbersItem(demiurge.Item):
+            number = demiurge.TextField(selector='.n', coerce=int)
+            ratio = demiurge.TextField(selector='.f', coerce=float)
+            label = demiurge.TextField(selector='.n')
+
+            class Meta:
+                selector = 'p'
+
+        with patch('demiurge.demiurge.import_numpy', return_value=None):
+            columns = NumbersItem.columns_from(html)
+
+        self.assertEqual(columns['number'], array.array('q', [0, 1, 2]))
+        self.assertEqual(columns['ratio'], array.array('d', [0.5, 1.5, 2.5]))
+        self.assertEqual(columns['label'], ['0', '1', '2'])
+
+    def test_make_column(self):
+        self.assertEqual(
+            demiurge.make_column([1, None], int), [1, None])
+        self.assertEqual(
+            demiurge.make_column([2 ** 70], int), [2 ** 70])
+        self.assertEqual(demiurge.make_column([True], bool), [True])
+
+    @unittest.skipIf(
+        demiurge.demiurge.import_numpy() is None, 'NumPy not available')
+    def test_make_column_numpy(self):
+        column = demiurge.make_column([1, 2], int)
+
+        self.assertEqual(column.dtype.name, 'int64')
+        self.assertEqual(column.tolist(), [1, 2])
+
+    def test_map_from(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filenames = []
+        for i in range(4):
+            filename = os.path.join(tempdir, '%d.html' % i)
+            with open(filename, 'w') as f:
+                f.write(HTML_SAMPLE.replace('Link text.', 'Link %d.' % i))
+            filenames.append(filename)
+        sources = filenames + [{'filename': filenames[0]}]
+
+        results = list(TestItem.map_from(sources, processes=2))
+
+        self.assertEqual([source for source, records in results], sources)
+        labels = [[r['label'] for r in records] for source, records in results]
+        self.assertEqual(labels, [
+            ['Link 0.', 'Another link.'],
+            ['Link 1.', 'Another link.'],
+            ['Link 2.', 'Another link.'],
+            ['Link 3.', 'Another link.'],
+            ['Link 0.', 'Another link.'],
+        ])
+        self.assertEqual(
+            results[0][1][1]['url'], 'http://github.com/matiasb/demiurge')
+
+    def test_map_from_unordered(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filename = os.path.join(tempdir, 'sample.html')
+        with open(filename, 'w') as f:
+            f.write(HTML_SAMPLE)
+
+        results = TestItem.map_from(
+            [filename] * 3, processes=2, ordered=False)
+
+        self.assertEqual(
+            [len(records) for source, records in results], [2, 2, 2])
+
+    def test_crawl(self):
+        pages = {
+            'http://localhost/index': HTML_INDEX_ABSOLUTE,
+            'http://localhost/index?page=2': HTML_INDEX_RELATIVE,
+            'http://localhost/index?page=3': HTML_SAMPLE,
+        }
+        self.mock_opener.side_effect = lambda url, kwargs: pages[url]
+
+        titles = [item.title for item in TestPaginatedItem.crawl()]
+
+        self.assertEqual(titles, ['First page', 'Second page', None])
+        urls = [c[0][0] for c in self.mock_opener.call_args_list]
+        self.assertEqual(urls, sorted(pages))
+
+    def test_crawl_max_pages(self):
+        self.mock_opener.side_effect = lambda url, kwargs: HTML_INDEX_RELATIVE
+
+        items = list(TestPaginatedItem.crawl(max_pages=1))
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual(self.mock_opener.call_count, 1)
+
+    def test_crawl_stops_on_visited_pages(self):
+        # page 3 links back to page 2
+        pages = {
+            'http://localhost/index': HTML_INDEX_ABSOLUTE,
+            'http://localhost/index?page=2': HTML_INDEX_RELATIVE,
+            'http://localhost/index?page=3': HTML_INDEX_ABSOLUTE,
+        }
+        self.mock_opener.side_effect = lambda url, kwargs: pages[url]
+
+        items = list(TestPaginatedItem.crawl())
+
+        self.assertEqual(len(items), 3)
+        self.assertEqual(self.mock_opener.call_count, 3)
+
+    def test_crawl_prefetches_next_page(self):
+        next_requested = threading.Event()
+
+        def opener(url, kwargs):
+            if url.endswith('page=2'):
+                next_requested.set()
+                return HTML_SAMPLE
+            return HTML_INDEX_ABSOLUTE
+
+        self.mock_opener.side_effect = opener
+        items = TestPaginatedItem.crawl()
+
+        first = next(items)
+        self.assertEqual(first.title, 'First page')
+        # next page is fetched before the first page items are consumed
+        self.assertTrue(next_requested.wait(5))
+        self.assertEqual(len(list(items)), 1)
+
+    def test_crawl_without_next_page(self):
+        with self.assertRaises(ValueError):
+            list(TestItem.crawl())
+
+    def test_walk(self):
+        self.mock_opener.side_effect = lambda url, kwargs: TREE_PAGES[
+            url.rstrip('/')]
+
+        result = [(depth, item.name)
+                  for depth, item in TestTreeLink.walk(workers=2)]
+
+        self.assertEqual(result, [
+            (0, '/a'), (0, '/b'),
+            (1, '/b'), (1, '/'), (1, '/c#top'), (1, '/a'),
+        ])
+        urls = sorted(c[0][0] for c in self.mock_opener.call_args_list)
+        self.assertEqual(urls, [
+            'http://localhost', 'http://localhost/a', 'http://localhost/b',
+            'http://localhost/c'])
+
+    def test_walk_caches_related_items(self):
+        self.mock_opener.side_effect = lambda url, kwargs: TREE_PAGES[
+            url.rstrip('/')]
+
+        items = [item for depth, item in TestTreeLink.walk(max_depth=1)]
+
+        self.assertEqual(
+            [i.name for i in items[0].target], ['/b', '/', '/c#top'])
+        self.assertEqual(self.mock_opener.call_count, 3)
+
+    def test_walk_max_depth(self):
+        self.mock_opener.side_effect = lambda url, kwargs: TREE_PAGES[
+            url.rstrip('/')]
+
+        result = list(TestTreeLink.walk(max_depth=0))
+
+        self.assertEqual(len(result), 2)
+        self.assertEqual(self.mock_opener.call_count, 1)
+
+    def test_walk_max_frontier(self):
+        self.mock_opener.side_effect = lambda url, kwargs: TREE_PAGES[
+            url.rstrip('/')]
+
+        result = [(depth, item.name) for depth, item in
+                  TestTreeLink.walk(max_depth=1, max_frontier=1)]
+
+        self.assertEqual(result, [
+            (0, '/a'), (0, '/b'), (1, '/b'), (1, '/'), (1, '/c#top')])
+
+    def test_walk_multi_hop(self):
+        pages = {
+            'http://localhost': HTML_INDEX_RELATIVE,
+            'http://localhost/links': HTML_SAMPLE,
+            'http://localhost?page=3': HTML_INDEX_ABSOLUTE,
+            'http://another-server/links': HTML_SAMPLE,
+            'http://localhost?page=2': HTML_INDEX_RELATIVE,
+        }
+        self.mock_opener.side_effect = lambda url, kwargs: pages[url]
+
+        result = [(depth, type(item).__name__)
+                  for depth, item in TestIndexItem.walk()]
+
+        self.assertEqual(result, [
+            (0, 'TestIndexItem'),
+            (1, 'TestItem'), (1, 'TestItem'), (1, 'TestIndexItem'),
+            (2, 'TestItem'), (2, 'TestItem'), (2, 'TestIndexItem'),
+        ])
+        self.assertEqual(self.mock_opener.call_count, 5)
+
+    def test_walk_given_related(self):
+        pages = {
+            'http://localhost': HTML_INDEX_RELATIVE,
+            'http://localhost?page=3': HTML_INDEX_ABSOLUTE,
+            'http://localhost?page=2': HTML_INDEX_RELATIVE,
+        }
+        self.mock_opener.side_effect = lambda url, kwargs: pages[url]
+
+        result = [(depth, item.title) for depth, item in
+                  TestIndexItem.walk(related=['next_page'])]
+
+        self.assertEqual(result, [
+            (0, 'Second page'), (1, 'First page'), (2, 'Second page')])
+
     def test_one_not_found(self):
         self.mock_opener.return_value = "<html></html>"
 
@@ -262,6 +813,62 @@ class TestDemiurge(unittest.TestCase):
         self.assertEqual(next_page.title, 'Second page')
         self.assertIn('?page=3', next_page.html)
 
+    def test_prefetch_related(self):
+        pages = {
+            'http://localhost/links': HTML_SAMPLE,
+            'http://another-server/links': HTML_SAMPLE,
+        }
+        self.mock_opener.side_effect = lambda url, kwargs: pages[url]
+        indexes = (TestIndexItem.all_from(HTML_INDEX_RELATIVE) +
+                   TestIndexItem.all_from(HTML_INDEX_ABSOLUTE) +
+                   TestIndexItem.all_from(HTML_INDEX_RELATIVE))
+
+        result = TestIndexItem.prefetch_related(
+            indexes, 'items_following_link', workers=2)
+
+        self.assertIs(result, indexes)
+        # each distinct URL is fetched once
+        urls = sorted(c[0][0] for c in self.mock_opener.call_args_list)
+        self.assertEqual(urls, sorted(pages))
+        for index in indexes:
+            links = index.items_following_link
+            self.assertEqual(
+                [link.label for link in links],
+                ['Link text.', 'Another link.'])
+        self.assertEqual(self.mock_opener.call_count, 2)
+
+    def test_prefetch_related_missing_link(self):
+        self.mock_opener.side_effect = lambda url, kwargs: HTML_SAMPLE
+        indexes = (TestIndexItem.all_from(HTML_INDEX_RELATIVE) +
+                   TestIndexItem.all_from('<html><h1>No links</h1></html>'))
+
+        TestIndexItem.prefetch_related(indexes, 'items_following_link')
+
+        self.assertEqual(self.mock_opener.call_count, 1)
+        self.assertEqual(len(indexes[0].items_following_link), 2)
+        self.assertNotIn('items_following_link', indexes[1].__dict__)
+        with self.assertRaises(IndexError):
+            indexes[1].items_following_link
+
+    def test_prefetch_related_subitems(self):
+        parents = TestInnerItem.all_from(HTML_SAMPLE)
+
+        TestInnerItem.prefetch_related(parents, 'inner_items')
+
+        self.assertEqual(parents[0].__dict__['inner_items'], [])
+        self.assertEqual(len(parents[1].__dict__['inner_items']), 2)
+        self.assertFalse(self.mock_opener.called)
+
+    def test_prefetch_related_already_resolved(self):
+        self.mock_opener.side_effect = [HTML_INDEX_RELATIVE, HTML_SAMPLE]
+        index = TestIndexItem.one()
+        links = index.items_following_link
+
+        TestIndexItem.prefetch_related([index], 'items_following_link')
+
+        self.assertIs(index.items_following_link, links)
+        self.assertEqual(self.mock_opener.call_count, 2)
+
     def test_setting_relateditem_raises(self):
         self.mock_opener.side_effect = [HTML_SAMPLE]
         parents = TestInnerItem.all()
@@ -270,6 +877,304 @@ class TestDemiurge(unittest.TestCase):
         with self.assertRaises(AttributeError):
             first.inner_items = []
 
+    def test_selector_plan(self):
+        plan = TestIndexItem.selector_plan()
+
+        self.assertEqual(plan['selector'], 'descendant-or-self::html')
+        self.assertEqual(plan['fields'], {'title': 'descendant-or-self::h1'})
+        self.assertEqual(sorted(plan['related']),
+                         ['items_following_link', 'next_page'])
+        self.assertIn("' link '", plan['related']['items_following_link'])
+
+    def test_selector_plan_no_field_selector(self):
+        class NoSelectorItem(demiurge.Item):
+            label = demiurge.TextField()
+
+        plan = NoSelectorItem.selector_plan()
+        self.assertEqual(plan['fields'], {'label': None})
+
+    def test_selectors_compiled_once(self):
+        compiled = demiurge.compile_selector('td:eq(2) a')
+        self.assertIs(demiurge.compile_selector('td:eq(2) a'), compiled)
+        self.assertIsNot(
+            demiurge.compile_selector('td:eq(2) a', xhtml=True), compiled)
+
+    def test_compiled_selector_matches_pyquery(self):
+        pq = pyquery.PyQuery(HTML_SAMPLE)
+        for selector in ('p.p_with_link', '.link:eq(1)', 'div:gt(0) a'):
+            compiled = demiurge.compile_selector(selector)
+            self.assertEqual(compiled.all(pq), list(pq(selector)))
+            self.assertIs(compiled.first(pq), pq(selector)[0])
+
+    def test_compiled_selector_first_not_found(self):
+        pq = pyquery.PyQuery(HTML_SAMPLE)
+        compiled = demiurge.compile_selector('.not-found')
+        self.assertIsNone(compiled.first(pq))
+        self.assertEqual(compiled.all(pq), [])
+
+    def test_compiled_selector_nth(self):
+        pq = pyquery.PyQuery(HTML_SAMPLE)
+        sections = pq('div.section, div.pagination')
+        for selector in ('a', 'p.p_with_link', 'div:gt(0) a'):
+            compiled = demiurge.compile_selector(selector)
+            matches = list(sections(selector))
+            for index in (0, 1, 2, 3, 4, -1):
+                self.assertIs(
+                    compiled.nth(sections, index),
+                    matches[index] if -len(matches) <= index < len(matches)
+                    else None)
+
+    def test_compiled_selector_nth_from_root(self):
+        pq = pyquery.PyQuery(HTML_SAMPLE)
+        selectors = (
+            'a', 'p.p_with_link', 'div.section a', 'div > p > a.link',
+            'p + p a', 'div ~ div a', 'div.section p:eq(1)', '[@href]',
+            'a, p', 'DIV P')
+        for selector in selectors:
+            compiled = demiurge.compile_selector(selector)
+            matches = list(pq(selector))
+            for index in range(len(matches) + 1):
+                expected = matches[index] if index < len(matches) else None
+                self.assertIs(compiled.nth(pq, index), expected, selector)
+                with patch('demiurge.demiurge.SCAN_LIMIT', 2):
+                    self.assertIs(
+                        compiled.nth(pq, index), expected, selector)
+
+    def test_one_stops_at_match(self):
+        compiled = TestItem._meta.compiled_selector
+        with patch.object(compiled, '_nth_xpath') as mock_nth:
+            item = TestItem.one()
+
+        self.assertEqual(item.label, 'Link text.')
+        self.assertFalse(mock_nth.called)
+
+    def test_one_does_not_collect_all_matches(self):
+        with patch.object(demiurge.CompiledSelector, 'all') as mock_all:
+            item = TestItem.one(index=1)
+
+        self.assertEqual(item.label, 'Another link.')
+        self.assertFalse(mock_all.called)
+
+    def test_one_from(self):
+        item = TestItem.one_from(HTML_SAMPLE, index=1)
+
+        self.assertEqual(item.url, 'http://github.com/matiasb/demiurge')
+        self.assertEqual(TestItem.one_from(HTML_SAMPLE, index=-1).url,
+                         item.url)
+        with self.assertRaises(demiurge.ItemDoesNotExist):
+            TestItem.one_from(HTML_SAMPLE, index=2)
+
+    def test_iterparse_one_stops_parsing(self):
+        rows = ''.join(
+            '<p class="p_with_link"><a class="link" href="/%d">%d</a></p>' % (
+                i, i) for i in range(20000))
+        source = io.BytesIO(
+            ('<html><body>%s</body></html>' % rows).encode('utf-8'))
+
+        item = TestItem.iterparse_one(source, index=2)
+
+        self.assertEqual((item.label, item.url), ('2', '/2'))
+        self.assertLess(source.tell(), len(source.getvalue()) // 2)
+
+    def test_iterparse_one_not_found(self):
+        source = io.BytesIO(HTML_SAMPLE.encode('utf-8'))
+
+        with self.assertRaises(demiurge.ItemDoesNotExist):
+            TestItem.iterparse_one(source, index=2)
+
+    def test_lxml_backend_values(self):
+        items = TestLxmlItem.all_from(HTML_SAMPLE)
+
+        self.assertEqual(
+            [(i.label, i.url, i.title) for i in items],
+            [('Link text.', 'http://github.com/matiasb',
+              'Some text. Link text.'),
+             ('Another link.', 'http://github.com/matiasb/demiurge',
+              'Another link.')])
+        # no PyQuery object until needed
+        self.assertNotIn('_pq', items[0].__dict__)
+        self.assertEqual(
+            [i.label for i in items[0].inner], ['Link text.'])
+        self.assertIn('Some text.', items[0].html)
+
+    def test_lxml_backend_text_as_pyquery(self):
+        html = ('<html><body><div class="entry"><p>Hello<br>world</p>'
+                '<div>x</div><span>695.81&nbsp;MB</span>'
+                '<textarea>a &lt;b&gt;</textarea></div></body></html>')
+
+        class Entry(demiurge.Item):
+            text = demiurge.TextField()
+            size = demiurge.TextField(selector='span')
+            notes = demiurge.TextField(selector='textarea')
+
+            class Meta:
+                selector = 'div.entry'
+
+        class LxmlEntry(Entry):
+            class Meta:
+                selector = 'div.entry'
+                backend = 'lxml'
+
+        expected = Entry.one_from(html).as_record()
+        self.assertEqual(expected['size'], '695.81\xa0MB')
+        self.assertEqual(LxmlEntry.all_from(html)[0].as_record(), expected)
+        self.assertEqual(LxmlEntry.one_from(html).as_record(), expected)
+        backend = LxmlEntry._meta.backend
+        with patch.object(
+                backend, 'values', side_effect=backend.values) as mock_values:
+            columns = LxmlEntry.columns_from(html)
+        self.assertEqual(
+            columns, dict((name, [value]) for name, value in expected.items()))
+        self.assertEqual(mock_values.call_count, 3)
+
+    def test_lxml_backend_one(self):
+        item = TestLxmlItem.one(index=1)
+
+        self.assertEqual(item.label, 'Another link.')
+        # backend is not passed to the opener
+        self.mock_opener.assert_called_once_with('http://localhost', {})
+
+    def test_lxml_backend_custom_field(self):
+        class UpperField(demiurge.TextField):
+            def get_value(self, pq):
+                return pq('a').text().upper()
+
+        class CustomItem(demiurge.Item):
+            label = UpperField()
+            url = demiurge.AttributeValueField(selector='a', attr='href')
+
+            class Meta:
+                selector = 'p.p_with_link'
+                backend = 'lxml'
+
+        self.assertFalse(CustomItem._fields['label'].supports_elements())
+        self.assertTrue(CustomItem._fields['url'].supports_elements())
+        items = CustomItem.all_from(HTML_SAMPLE)
+        self.assertEqual(
+            [i.label for i in items], ['LINK TEXT.', 'ANOTHER LINK.'])
+        self.assertEqual(CustomItem.one_from(HTML_SAMPLE).label, 'LINK TEXT.')
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            class UnknownBackendItem(demiurge.Item):
+                class Meta:
+                    backend = 'selectolax'
+
+    def test_sibling_selector_fields(self):
+        html = ('<html><body><dl><dt>Name</dt><dd title="n">Ubuntu</dd>'
+                '<dt>Size</dt><dd title="s">700 MB</dd></dl>'
+                '<ul><li>1</li><li>2</li><li>3</li></ul></body></html>')
+
+        for backend in ('pyquery', 'lxml'):
+            class Detail(demiurge.Item):
+                label = demiurge.TextField()
+                value = demiurge.TextField(selector='dt + dd')
+                title = demiurge.AttributeValueField(
+                    selector='dt + dd', attr='title')
+
+                class Meta:
+                    selector = 'dt'
+
+            class Entry(demiurge.Item):
+                following = demiurge.TextField(selector='li + li')
+
+                class Meta:
+                    selector = 'li'
+
+            Detail._meta.backend = Entry._meta.backend = (
+                demiurge.demiurge.get_backend(backend))
+            self.assertEqual(
+                [(i.label, i.value, i.title)
+                 for i in Detail.all_from(html)],
+                [('Name', 'Ubuntu', 'n'), ('Size', '700 MB', 's')])
+            self.assertEqual(
+                Detail.one_from(html, index=1).value, '700 MB')
+            # matching siblings which are also items
+            self.assertEqual(
+                [i.following for i in Entry.all_from(html)],
+                ['2', '3', None])
+
+    def count_calls(self, method):
+        original = getattr(demiurge.CompiledSelector, method)
+        patcher = patch.object(
+            demiurge.CompiledSelector, method, autospec=True,
+            side_effect=original)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_fields_share_selector_matches(self):
+        first = self.count_calls('first')
+        first_each = self.count_calls('first_each')
+
+        item = TestItem.one()
+        items = TestItem.all()
+
+        self.assertEqual((item.label, item.url),
+                         ('Link text.', 'http://github.com/matiasb'))
+        self.assertEqual([i.url for i in items], [
+            'http://github.com/matiasb', 'http://github.com/matiasb/demiurge'])
+        # '.link' matched once for the item, and once for all the items
+        self.assertEqual(first.call_count, 1)
+        self.assertEqual(first_each.call_count, 1)
+        # matches are not kept, no related items use them
+        self.assertNotIn('_matches', item.__dict__)
+        self.assertNotIn('_matches', items[0].__dict__)
+
+    def test_related_item_shares_selector_matches(self):
+        items = TestSharedSelectorItem.all()
+        first = self.count_calls('first')
+
+        following = [i.following for i in items]
+
+        self.assertEqual(len(following), 2)
+        self.assertEqual(following[0][0].label, 'Link text.')
+        extra = {'extra_attribute': 'value'}
+        self.mock_opener.assert_any_call('http://github.com/matiasb', extra)
+        self.mock_opener.assert_any_call(
+            'http://github.com/matiasb/demiurge', extra)
+        # the link was not matched again, only the related items fields
+        for call in first.call_args_list:
+            self.assertNotEqual(call[0][0].selector, '.link')
+
+    def test_related_item_shares_selector_matches_one(self):
+        item = TestSharedSelectorItem.one(index=1)
+        first = self.count_calls('first')
+
+        item.following
+
+        self.assertEqual(item.url, 'http://github.com/matiasb/demiurge')
+        self.mock_opener.assert_called_with(
+            'http://github.com/matiasb/demiurge', {'extra_attribute': 'value'})
+        self.assertFalse(
+            [c for c in first.call_args_list if c[0][0].selector == '.link'])
+
+    def test_lazy_meta_not_passed_to_opener(self):
+        TestLazyItem.one()
+
+        self.mock_opener.assert_called_once_with('http://localhost', {})
+
+    def test_lazy_fields_extracted_on_access(self):
+        items = TestLazyItem.all()
+
+        self.assertEqual(len(items), 2)
+        self.assertNotIn('label', items[0].__dict__)
+        with patch.object(TestLazyItem._fields['url'], 'get_value',
+                          return_value='http://example.com') as get_value:
+            self.assertEqual(items[0].url, 'http://example.com')
+            self.assertEqual(items[0].url, 'http://example.com')
+        # extracted once, then memoized
+        get_value.assert_called_once_with(items[0]._pq)
+        self.assertEqual(items[0].__dict__['url'], 'http://example.com')
+        self.assertNotIn('label', items[0].__dict__)
+
+    def test_lazy_fields_values(self):
+        items = TestLazyItem.all_from(HTML_SAMPLE)
+
+        self.assertEqual(items[0].label, 'LINK TEXT.')
+        self.assertEqual(items[0].url, 'http://github.com/matiasb')
+        self.assertEqual(items[1].label, 'ANOTHER LINK.')
+        self.assertEqual(items[1].url, 'http://github.com/matiasb/demiurge')
+
 
 if __name__ == '__main__':
     unittest.main()
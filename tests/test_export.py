@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from mock import patch
+
+import demiurge
+from demiurge import export
+
+
+HTML_ROWS = """
+<html>
+    <body>
+        <ul class="row"><li class="name">One</li><li class="size">1</li>
+            <li class="tag">a</li><li class="tag">b</li></ul>
+        <ul class="row"><li class="name">Tw\xf6</li><li class="size">2</li>
+            </ul>
+        <ul class="row"><li class="name">"Three", 3</li>
+            <li class="size">3</li><li class="tag">c</li></ul>
+    </body>
+</html>
+"""
+
+
+class Tag(demiurge.Item):
+    label = demiurge.TextField()
+
+    class Meta:
+        selector = 'li.tag'
+
+
+class Row(demiurge.Item):
+    name = demiurge.TextField(selector='li.name')
+    size = demiurge.TextField(selector='li.size', coerce=int)
+    tags = demiurge.RelatedItem(Tag)
+
+    class Meta:
+        selector = 'ul.row'
+
+
+class DetachedRow(Row):
+
+    class Meta:
+        selector = 'ul.row'
+        detach = True
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ExportTestCase, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.items = Row.all_from(HTML_ROWS)
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def test_layout(self):
+        layout = export.layout(Row)
+
+        self.assertEqual(layout.columns, ('name', 'size'))
+        self.assertEqual(
+            list(layout.rows(self.items)),
+            [('One', 1), ('Tw\xf6', 2), ('"Three", 3', 3)])
+        # computed once per class
+        self.assertIs(export.layout(Row), layout)
+
+    def test_layout_flattened_related(self):
+        layout = export.layout(Row, related=['tags'])
+
+        self.assertEqual(layout.columns, ('name', 'size', 'tags__label'))
+        self.assertEqual(list(layout.rows(self.items)), [
+            ('One', 1, 'a'), ('One', 1, 'b'), ('Tw\xf6', 2, None),
+            ('"Three", 3', 3, 'c')])
+
+    def test_layout_unknown_related(self):
+        with self.assertRaises(ValueError):
+            export.layout(Row, related=['missing'])
+
+    def test_jsonl(self):
+        path = self.path('rows.jsonl')
+
+        with demiurge.JSONLExporter(Row, path, batch_size=2) as exporter:
+            self.assertEqual(exporter.write(self.items), 3)
+            self.assertEqual(exporter.write(iter(self.items[:1])), 1)
+            self.assertEqual(exporter.count, 4)
+
+        with io.open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'name': 'One', 'size': 1},
+            {'name': 'Tw\xf6', 'size': 2},
+            {'name': '"Three", 3', 'size': 3},
+            {'name': 'One', 'size': 1},
+        ])
+
+    def test_jsonl_file_object(self):
+        output = io.StringIO()
+
+        with demiurge.JSONLExporter(DetachedRow, output) as exporter:
+            exporter.write(DetachedRow.all_from(HTML_ROWS))
+
+        self.assertFalse(output.closed)
+        self.assertEqual(
+            output.getvalue().splitlines()[1], '{"name":"Tw\xf6","size":2}')
+
+    def test_csv(self):
+        path = self.path('rows.csv')
+
+        with demiurge.CSVExporter(Row, path, related=['tags']) as exporter:
+            exporter.write(self.items)
+
+        with io.open(path, encoding='utf-8', newline='') as f:
+            content = f.read()
+        self.assertEqual(content, '\r\n'.join([
+            'name,size,tags__label',
+            'One,1,a',
+            'One,1,b',
+            'Tw\xf6,2,',
+            '"""Three"", 3",3,c',
+        ]) + '\r\n')
+
+    def test_csv_format(self):
+        output = io.StringIO()
+
+        with demiurge.CSVExporter(
+                Row, output, header=False, delimiter='\t',
+                lineterminator='\n') as exporter:
+            exporter.write(self.items[:2])
+
+        self.assertEqual(output.getvalue(), 'One\t1\nTw\xf6\t2\n')
+
+    def test_sqlite(self):
+        path = self.path('rows.sqlite')
+
+        with demiurge.SQLiteExporter(Row, path, batch_size=2) as exporter:
+            exporter.write(self.items)
+
+        db = sqlite3.connect(path)
+        self.addCleanup(db.close)
+        self.assertEqual(
+            db.execute('SELECT name, size FROM Row').fetchall(),
+            [('One', 1), ('Tw\xf6', 2), ('"Three", 3', 3)])
+        columns = db.execute('PRAGMA table_info(Row)').fetchall()
+        self.assertEqual(
+            [(c[1], c[2]) for c in columns],
+            [('name', ''), ('size', 'INTEGER')])
+
+    def test_sqlite_connection(self):
+        db = sqlite3.connect(':memory:')
+        self.addCleanup(db.close)
+
+        exporter = demiurge.SQLiteExporter(
+            Row, db, table='tagged rows', related=['tags'])
+        exporter.write(self.items)
+        exporter.write(self.items[2:])
+        exporter.close()
+
+        self.assertEqual(
+            db.execute('SELECT COUNT(*), SUM(size) FROM "tagged rows"'
+                       ' WHERE tags__label IS NOT NULL').fetchone(),
+            (4, 8))
+
+    def test_sqlite_batches_in_transactions(self):
+        db = sqlite3.connect(':memory:')
+        self.addCleanup(db.close)
+        exporter = demiurge.SQLiteExporter(Row, db, batch_size=2)
+
+        with patch.object(
+                exporter, 'write_rows',
+                side_effect=exporter.write_rows) as mock_write:
+            exporter.write(self.items)
+
+        self.assertEqual(
+            [len(args[0]) for args, kwargs in mock_write.call_args_list],
+            [2, 1])
+        self.assertFalse(db.in_transaction)
+
+
+if __name__ == '__main__':
+    unittest.main()
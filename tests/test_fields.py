@@ -3,6 +3,7 @@
 import unittest
 
 import pyquery
+from mock import patch
 
 from demiurge import AttributeValueField, TextField
 
@@ -21,6 +22,15 @@ HTML_SAMPLE = """
 """
 
 
+HTML_ROWS = """
+<table>
+    <tr><td>a1</td><td>b1</td></tr>
+    <tr><td>a2</td><span>s2</span></tr>
+    <tr><td>a3</td><td>b3</td></tr>
+</table>
+"""
+
+
 class TextFieldTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -59,6 +69,44 @@ class TextFieldTestCase(unittest.TestCase):
         field = TextField(coerce=int)
         self.assertEqual(field.coerce("5"), 5)
 
+    def test_get_values(self):
+        rows = list(self.pq('a').items())
+        field = TextField()
+        self.assertEqual(
+            field.get_values(rows), ["Link text.", "Another link."])
+
+    def test_get_values_using_selector(self):
+        rows = list(pyquery.PyQuery(HTML_ROWS)('tr').items())
+        field = TextField(selector='td:eq(1)')
+        self.assertEqual(field.get_values(rows), ['b1', None, 'b3'])
+        self.assertEqual(
+            field.get_values(rows), [field.get_value(row) for row in rows])
+
+    def test_get_values_in_batches(self):
+        rows = list(pyquery.PyQuery(HTML_ROWS)('tr').items())
+        field = TextField(selector='td:eq(1)')
+        with patch('demiurge.demiurge.BATCH_SIZE', 2):
+            self.assertEqual(field.get_values(rows), ['b1', None, 'b3'])
+
+    def test_get_values_nested_rows(self):
+        rows = list(pyquery.PyQuery(HTML_ROWS)('table, tr').items())
+        field = TextField(selector='td')
+        self.assertEqual(field.get_values(rows), ['a1', 'a1', 'a2', 'a3'])
+
+    def test_get_values_union_selector(self):
+        rows = list(pyquery.PyQuery(HTML_ROWS)('tr').items())
+        field = TextField(selector='span, td:eq(1)')
+        self.assertEqual(field.get_values(rows), ['b1', 's2', 'b3'])
+
+    def test_get_values_custom_get_value(self):
+        class UpperField(TextField):
+            def get_value(self, pq):
+                return super(UpperField, self).get_value(pq).upper()
+
+        rows = list(pyquery.PyQuery(HTML_ROWS)('tr').items())
+        field = UpperField(selector='td')
+        self.assertEqual(field.get_values(rows), ['A1', 'A2', 'A3'])
+
 
 class AttributeValueFieldTestCase(unittest.TestCase):
 
@@ -87,6 +135,16 @@ class AttributeValueFieldTestCase(unittest.TestCase):
         value = field.get_value(self.pq)
         self.assertIsNone(value)
 
+    def test_get_values(self):
+        rows = list(self.pq('p').items()) + list(self.pq('p').items())
+        field = AttributeValueField(selector='.link', attr='href')
+        self.assertEqual(
+            field.get_values(rows), ["http://github.com/matiasb"] * 2)
+        rows = list(self.pq('.link').items())
+        field = AttributeValueField(attr='href')
+        self.assertEqual(field.get_values(rows), [
+            "http://github.com/matiasb", "http://github.com/matiasb/demiurge"])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+import demiurge
+from demiurge.cache import HTTPCache
+from demiurge.transport import Session
+from tests.httpserver import StubServer
+
+
+HTML_PAGE = """
+<html>
+    <body>
+        <p class="entry"><a href="/detail">Entry</a></p>
+    </body>
+</html>
+"""
+
+HTML_DETAIL = """
+<html><body><h1>Detail</h1></body></html>
+"""
+
+
+class Detail(demiurge.Item):
+    title = demiurge.TextField(selector='h1')
+
+
+class Entry(demiurge.Item):
+    name = demiurge.TextField(selector='a')
+    detail = demiurge.RelatedItem(Detail, selector='a', attr='href')
+
+    class Meta:
+        selector = 'p.entry'
+
+
+def conditional(body, etag=None, last_modified=None):
+    """Route replying 304 if the request validators match."""
+    def route(handler):
+        headers = {}
+        if etag:
+            headers['ETag'] = etag
+        if last_modified:
+            headers['Last-Modified'] = last_modified
+        if (etag and handler.headers.get('If-None-Match') == etag or
+                last_modified and
+                handler.headers.get('If-Modified-Since') == last_modified):
+            return 304, headers, ''
+        return 200, headers, body
+    return route
+
+
+class HTTPCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(HTTPCacheTestCase, self).setUp()
+        self.server = StubServer()
+        self.server.routes['/'] = conditional(HTML_PAGE, etag='"v1"')
+        self.server.routes['/detail'] = conditional(
+            HTML_DETAIL, last_modified='Sat, 01 Jan 2000 00:00:00 GMT')
+        self.server.add('/plain', HTML_PAGE)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, 'cache.sqlite')
+        self.cache = HTTPCache(self.path)
+        self.addCleanup(self.cache.close)
+        self.session = Session(cache=self.cache)
+        self.addCleanup(self.session.close)
+
+        for item in (Entry, Detail):
+            patcher = patch.object(item._meta, 'transport', self.session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        Entry._meta.base_url = self.server.url()
+
+    def test_conditional_request(self):
+        first = self.session.request(self.server.url('/'))
+        second = self.session.request(self.server.url('/'))
+
+        self.assertFalse(first.not_modified)
+        self.assertTrue(second.not_modified)
+        self.assertEqual(second.status, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.server.requests[1][1]['If-None-Match'], '"v1"')
+        self.assertEqual(self.cache.stats(), {
+            'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_last_modified_validator(self):
+        self.session.request(self.server.url('/detail'))
+        self.session.request(self.server.url('/detail'))
+
+        headers = self.server.requests[1][1]
+        self.assertEqual(
+            headers['If-Modified-Since'], 'Sat, 01 Jan 2000 00:00:00 GMT')
+        self.assertNotIn('If-None-Match', headers)
+
+    def test_no_validators_not_cached(self):
+        self.session.request(self.server.url('/plain'))
+        self.session.request(self.server.url('/plain'))
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertNotIn('If-None-Match', self.server.requests[1][1])
+
+    def test_changed_document(self):
+        self.session.request(self.server.url('/'))
+        self.server.routes['/'] = conditional(
+            HTML_DETAIL, etag='"v2"')
+
+        response = self.session.request(self.server.url('/'))
+
+        self.assertFalse(response.not_modified)
+        self.assertEqual(response.text, HTML_DETAIL)
+        self.assertEqual(self.cache.get(self.server.url('/'))['etag'], '"v2"')
+
+    def test_not_modified_skips_parse(self):
+        first = Entry.all()
+        second = Entry.all()
+
+        self.assertEqual(second[0].name, 'Entry')
+        # same parsed document is reused
+        self.assertIs(second[0]._pq[0], first[0]._pq[0])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_related_item(self):
+        Entry.all()[0].detail
+        detail = Entry.all()[0].detail
+
+        self.assertEqual(detail[0].title, 'Detail')
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_persistent(self):
+        self.session.request(self.server.url('/'))
+        self.cache.close()
+        cache = HTTPCache(self.path)
+        self.addCleanup(cache.close)
+        session = Session(cache=cache)
+        self.addCleanup(session.close)
+
+        response = session.request(self.server.url('/'))
+
+        self.assertTrue(response.not_modified)
+        self.assertEqual(response.text, HTML_PAGE)
+
+    def test_entries(self):
+        self.session.request(self.server.url('/'))
+
+        entries = self.cache.entries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['url'], self.server.url('/'))
+        self.assertEqual(entries[0]['etag'], '"v1"')
+        self.assertEqual(entries[0]['size'], len(HTML_PAGE))
+
+    def test_prune_max_entries(self):
+        self.session.request(self.server.url('/'))
+        self.session.request(self.server.url('/detail'))
+
+        removed = self.cache.prune(max_entries=1)
+
+        self.assertEqual(removed, 1)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_prune_max_age(self):
+        self.session.request(self.server.url('/'))
+        with patch('demiurge.cache.time.time', return_value=0):
+            self.session.request(self.server.url('/detail'))
+
+        removed = self.cache.prune(max_age=60)
+
+        self.assertEqual(removed, 1)
+        self.assertIsNone(self.cache.get(self.server.url('/detail')))
+
+    def test_delete_and_clear(self):
+        self.session.request(self.server.url('/'))
+        self.session.request(self.server.url('/detail'))
+
+        self.cache.delete(self.server.url('/'))
+        self.assertEqual(len(self.cache), 1)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
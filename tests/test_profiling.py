@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from mock import patch
+
+import demiurge
+from demiurge import profiling
+from demiurge.transport import Session
+from tests.httpserver import StubServer
+
+
+HTML_INDEX = """
+<html>
+    <body>
+        <p class="entry"><a href="/page">First</a><span>1</span></p>
+        <p class="entry"><a href="/page">Second</a><span>2</span></p>
+    </body>
+</html>
+"""
+
+HTML_PAGE = """
+<html><body><h1>Title</h1></body></html>
+"""
+
+
+class Page(demiurge.Item):
+    title = demiurge.TextField(selector='h1')
+
+    class Meta:
+        base_url = 'http://localhost'
+
+
+class Entry(demiurge.Item):
+    name = demiurge.TextField(selector='a')
+    rank = demiurge.TextField(selector='span', coerce=int)
+    page = demiurge.RelatedItem(Page, selector='a', attr='href')
+
+    def clean_name(self, value):
+        return value.upper()
+
+    class Meta:
+        base_url = 'http://localhost'
+        selector = 'p.entry'
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ProfilerTestCase, self).setUp()
+        patcher = patch('demiurge.demiurge.pyquery.pyquery.url_opener')
+        self.addCleanup(patcher.stop)
+        self.mock_opener = patcher.start()
+        self.mock_opener.return_value = HTML_INDEX
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(profiling.active)
+        with patch.object(profiling.Profiler, 'add') as mock_add:
+            Entry.all()
+
+        self.assertFalse(mock_add.called)
+
+    def test_item_phases(self):
+        with demiurge.Profiler() as profiler:
+            entries = Entry.all()
+
+        self.assertIsNone(profiling.active)
+        self.assertEqual([e.name for e in entries], ['FIRST', 'SECOND'])
+        stats = profiler.as_dict()
+        self.assertEqual(list(stats), ['Entry'])
+        self.assertEqual(
+            sorted(stats['Entry']['']), ['fetch', 'parse', 'select'])
+        for phase in ('fetch', 'parse', 'select'):
+            self.assertEqual(stats['Entry'][''][phase]['count'], 1)
+            self.assertGreaterEqual(stats['Entry'][''][phase]['time'], 0)
+        # field values are extracted for all the items at once, counted per
+        # item
+        self.assertEqual(stats['Entry']['rank']['extract']['count'], 2)
+        self.assertEqual(stats['Entry']['rank']['clean']['count'], 2)
+        self.assertEqual(stats['Entry']['rank']['coerce']['count'], 2)
+        self.assertNotIn('clean_method', stats['Entry']['rank'])
+        self.assertEqual(stats['Entry']['name']['clean_method']['count'], 2)
+
+    def test_one_per_item_extraction(self):
+        with demiurge.Profiler() as profiler:
+            Entry.one(index=1)
+
+        stats = profiler.as_dict()['Entry']
+        self.assertEqual(stats['name']['extract']['count'], 1)
+        self.assertEqual(stats['']['select']['count'], 1)
+
+    def test_counts_per_item(self):
+        with demiurge.Profiler() as profiler:
+            Entry.all_from(HTML_INDEX)
+            Entry.one_from(HTML_INDEX)
+            Entry.columns_from(HTML_INDEX)
+
+        stats = profiler.as_dict()['Entry']
+        for phase in ('extract', 'clean', 'coerce'):
+            self.assertEqual(stats['rank'][phase]['count'], 5)
+
+    def test_parse_from_source(self):
+        with demiurge.Profiler() as profiler:
+            Entry.all_from(HTML_INDEX)
+            Entry.one_from(HTML_INDEX)
+            Entry.all_from_bytes(HTML_INDEX.encode('utf-8'))
+            demiurge.Document.parse(HTML_INDEX)
+
+        stats = profiler.as_dict()
+        self.assertEqual(stats['Entry']['']['parse']['count'], 3)
+        self.assertNotIn('fetch', stats['Entry'][''])
+        self.assertEqual(stats['Document']['']['parse']['count'], 1)
+        self.assertFalse(self.mock_opener.called)
+
+    def test_related_items(self):
+        entries = Entry.all()
+        self.mock_opener.return_value = HTML_PAGE
+
+        with demiurge.Profiler() as profiler:
+            entries[0].page
+
+        stats = profiler.as_dict()
+        self.assertEqual(stats['Entry']['page']['related']['count'], 1)
+        self.assertEqual(stats['Page']['']['fetch']['count'], 1)
+        self.assertEqual(stats['Page']['title']['extract']['count'], 1)
+
+    def test_stop_restores_previous(self):
+        outer = demiurge.Profiler()
+        outer.start()
+        self.addCleanup(setattr, profiling, 'active', None)
+        with demiurge.Profiler() as inner:
+            Entry.all()
+            self.assertIs(profiling.active, inner)
+        self.assertIs(profiling.active, outer)
+        outer.stop()
+
+        self.assertIsNone(profiling.active)
+        self.assertEqual(outer.as_dict(), {})
+
+    def test_reset(self):
+        with demiurge.Profiler() as profiler:
+            Entry.all()
+        profiler.reset()
+
+        self.assertEqual(profiler.as_dict(), {})
+
+    def test_prometheus(self):
+        profiler = demiurge.Profiler()
+        profiler.add('Entry', '', 'fetch', 0.5)
+        profiler.add('Entry', '', 'fetch', 0.25)
+        profiler.add('Entry', 'na"me', 'clean', 0.125)
+
+        self.assertEqual(profiler.prometheus(), '\n'.join([
+            '# HELP demiurge_calls_total Number of calls.',
+            '# TYPE demiurge_calls_total counter',
+            'demiurge_calls_total{item="Entry",target="",phase="fetch"} 2',
+            'demiurge_calls_total'
+            '{item="Entry",target="na\\"me",phase="clean"} 1',
+            '# HELP demiurge_seconds_total Total time spent, in seconds.',
+            '# TYPE demiurge_seconds_total counter',
+            'demiurge_seconds_total'
+            '{item="Entry",target="",phase="fetch"} 0.75',
+            'demiurge_seconds_total'
+            '{item="Entry",target="na\\"me",phase="clean"} 0.125',
+        ]) + '\n')
+
+
+class ProfiledSessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ProfiledSessionTestCase, self).setUp()
+        self.server = StubServer()
+        self.server.add('/', HTML_INDEX)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.session = Session(timeout=5)
+        self.addCleanup(self.session.close)
+
+    def test_fetch_and_parse_timed(self):
+        with demiurge.Profiler() as profiler:
+            document = demiurge.Document.fetch(
+                self.server.url('/'), transport=self.session)
+
+        self.assertEqual(len(document.all(Entry)), 2)
+        stats = profiler.as_dict()['Document']['']
+        self.assertEqual(stats['fetch']['count'], 1)
+        self.assertEqual(stats['parse']['count'], 1)
+        self.assertGreater(stats['fetch']['time'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
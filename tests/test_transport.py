@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import io
+import socket
+import threading
+import time
+import unittest
+import zlib
+
+import demiurge
+from demiurge.transport import (
+    HTTPError, Scheduler, Session, TokenBucket, decode_content)
+from tests.httpserver import StubServer
+
+
+HTML_LINKS = """
+<html>
+    <body>
+        <p class="entry"><a href="/page/1">Page 1</a></p>
+        <p class="entry"><a href="/page/2">Page 2</a></p>
+    </body>
+</html>
+"""
+
+HTML_PAGE = """
+<html><body><h1>Título</h1></body></html>
+"""
+
+
+def gzipped(text):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(text.encode('utf-8'))
+    return buf.getvalue()
+
+
+class Page(demiurge.Item):
+    title = demiurge.TextField(selector='h1')
+
+
+class Entry(demiurge.Item):
+    name = demiurge.TextField(selector='a')
+    page = demiurge.RelatedItem(Page, selector='a', attr='href')
+
+    class Meta:
+        selector = 'p.entry'
+
+
+class SessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SessionTestCase, self).setUp()
+        self.server = StubServer()
+        self.server.add('/', HTML_LINKS)
+        self.server.add('/page/1', HTML_PAGE)
+        self.server.add('/page/2', HTML_PAGE)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.session = Session(timeout=5)
+        self.addCleanup(self.session.close)
+
+    def test_connection_reused(self):
+        for path in ('/', '/page/1', '/page/2'):
+            response = self.session.request(self.server.url(path))
+            self.assertEqual(response.status, 200)
+
+        clients = set(r[2] for r in self.server.requests)
+        self.assertEqual(len(clients), 1)
+        self.assertEqual(self.session.pool.created, 1)
+
+    def test_keep_alive_and_encoding_headers(self):
+        self.session.request(self.server.url('/'))
+
+        headers = self.server.requests[0][1]
+        self.assertEqual(headers['Connection'], 'keep-alive')
+        self.assertEqual(headers['Accept-Encoding'], 'gzip, deflate')
+
+    def test_gzip_content(self):
+        self.server.add(
+            '/gzip', gzipped(HTML_PAGE), headers={'Content-Encoding': 'gzip'})
+
+        response = self.session.request(self.server.url('/gzip'))
+
+        self.assertEqual(response.text, HTML_PAGE)
+
+    def test_deflate_content(self):
+        content = b'deflated content'
+        self.assertEqual(
+            decode_content(zlib.compress(content), 'deflate'), content)
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw_content = raw.compress(content) + raw.flush()
+        self.assertEqual(decode_content(raw_content, 'deflate'), content)
+
+    def test_redirect(self):
+        self.server.add(
+            '/old', '', status=301, headers={'Location': '/page/1'})
+
+        response = self.session.request(self.server.url('/old'))
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.url, self.server.url('/page/1'))
+
+    def test_error_response(self):
+        with self.assertRaises(HTTPError) as ctx:
+            self.session.request(self.server.url('/missing'))
+        self.assertEqual(ctx.exception.response.status, 404)
+
+    def test_get_data_as_query_string(self):
+        self.session.request(self.server.url('/'), data={'page': 2})
+
+        self.assertEqual(self.server.requests[0][0], '/?page=2')
+
+    def test_get_bytes_data_as_query_string(self):
+        self.session.request(self.server.url('/?a=1'), data=b'page=2')
+
+        self.assertEqual(self.server.requests[0][0], '/?a=1&page=2')
+
+    def test_stale_connection_retried(self):
+        self.session.request(self.server.url('/'))
+        # server drops the kept-alive connection
+        for connections in self.session.pool._idle.values():
+            for connection in connections:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+
+        response = self.session.request(self.server.url('/page/1'))
+
+        self.assertEqual(response.status, 200)
+
+    def test_request_timeout(self):
+        def slow(handler):
+            time.sleep(0.5)
+            return 200, {}, HTML_PAGE
+        self.server.routes['/slow'] = slow
+        self.session.request(self.server.url('/'))
+
+        with self.assertRaises(socket.timeout):
+            self.session.request(self.server.url('/slow'), timeout=0.1)
+        response = self.session.request(self.server.url('/slow'))
+        self.assertEqual(response.status, 200)
+
+    def test_timeout_not_retried(self):
+        def slow(handler):
+            time.sleep(0.5)
+            return 200, {}, HTML_PAGE
+        self.server.routes['/slow'] = slow
+        # reused connection
+        self.session.request(self.server.url('/'))
+
+        with self.assertRaises(socket.timeout):
+            self.session.request(self.server.url('/slow'), timeout=0.1)
+        self.assertEqual(self.server.requested('/slow'), 1)
+
+    def test_opener_timeout(self):
+        self.session.request(self.server.url('/'))
+        [[connection]] = self.session.pool._idle.values()
+
+        self.session(self.server.url('/page/1'), timeout=2)
+
+        self.assertEqual(connection.sock.gettimeout(), 2)
+        self.session(self.server.url('/page/1'))
+        self.assertEqual(connection.sock.gettimeout(), 5)
+
+    def test_opener_unsupported_options(self):
+        with self.assertRaises(ValueError) as ctx:
+            self.session(self.server.url('/'), auth=('user', 'pass'),
+                         verify=False)
+
+        self.assertIn('auth, verify', str(ctx.exception))
+        self.assertEqual(self.server.requests, [])
+
+    def test_opener_decodes_charset(self):
+        html = self.session(self.server.url('/page/1'))
+
+        self.assertEqual(html, HTML_PAGE)
+
+    def test_item_meta_transport(self):
+        Entry._meta.transport = self.session
+        Entry._meta.base_url = self.server.url()
+        Page._meta.transport = self.session
+        self.addCleanup(setattr, Entry._meta, 'transport', None)
+        self.addCleanup(setattr, Page._meta, 'transport', None)
+
+        entries = Entry.all('/')
+        pages = [e.page[0] for e in entries]
+
+        self.assertEqual([e.name for e in entries], ['Page 1', 'Page 2'])
+        self.assertEqual([p.title for p in pages], ['Título', 'Título'])
+        # all requests went through the same connection
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.session.pool.created, 1)
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SchedulerTestCase, self).setUp()
+        self.server = StubServer()
+        self.server.add('/page/1', HTML_PAGE)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.delays = []
+
+    def session(self, **kwargs):
+        kwargs.setdefault('sleep', self.delays.append)
+        session = Session(timeout=5, scheduler=Scheduler(**kwargs))
+        self.addCleanup(session.close)
+        return session
+
+    def failing(self, failures, status=429, headers=None):
+        calls = []
+
+        def route(handler):
+            calls.append(handler.path)
+            if len(calls) <= failures:
+                return status, headers or {}, 'Slow down'
+            return 200, {}, HTML_PAGE
+        return route
+
+    def test_retry_after_honored(self):
+        self.server.routes['/'] = self.failing(
+            2, headers={'Retry-After': '3'})
+        session = self.session()
+
+        response = session.request(self.server.url('/'))
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.delays, [3, 3])
+
+    def test_retry_after_not_capped_by_max_backoff(self):
+        self.server.routes['/'] = self.failing(
+            1, headers={'Retry-After': '120'})
+        session = self.session(max_backoff=60)
+
+        response = session.request(self.server.url('/'))
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.delays, [120])
+
+    def test_max_retry_after(self):
+        self.server.routes['/'] = self.failing(
+            1, headers={'Retry-After': '120'})
+        session = self.session(max_retry_after=60)
+
+        with self.assertRaises(HTTPError) as cm:
+            session.request(self.server.url('/'))
+
+        self.assertEqual(cm.exception.response.status, 429)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.delays, [])
+
+    def test_exponential_backoff(self):
+        self.server.routes['/'] = self.failing(3, status=503)
+        session = self.session(backoff=0.5, max_backoff=1.5)
+
+        response = session.request(self.server.url('/'))
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(self.delays, [0.5, 1.0, 1.5])
+
+    def test_retries_exhausted(self):
+        self.server.routes['/'] = self.failing(5)
+        session = self.session(retries=2)
+
+        with self.assertRaises(HTTPError) as cm:
+            session.request(self.server.url('/'))
+
+        self.assertEqual(cm.exception.response.status, 429)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_not_retried(self):
+        session = self.session()
+
+        with self.assertRaises(HTTPError):
+            session.request(self.server.url('/missing'))
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.delays, [])
+
+    def test_rate_limited(self):
+        session = self.session(rate=20, sleep=time.sleep)
+
+        start = time.time()
+        for i in range(4):
+            session.request(self.server.url('/page/1'))
+
+        # first request uses the initial token, the rest wait 1/20s each
+        self.assertGreaterEqual(time.time() - start, 0.14)
+
+    def test_max_in_flight(self):
+        state = {'current': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def slow(handler):
+            with lock:
+                state['current'] += 1
+                state['max'] = max(state['max'], state['current'])
+            time.sleep(0.05)
+            with lock:
+                state['current'] -= 1
+            return 200, {}, HTML_PAGE
+        self.server.routes['/'] = slow
+        session = self.session(max_in_flight=1)
+
+        threads = [
+            threading.Thread(target=session.request,
+                             args=(self.server.url('/'),))
+            for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(state['max'], 1)
+
+    def test_item_meta_transport(self):
+        self.server.routes['/'] = self.failing(1)
+        Page._meta.transport = self.session()
+        self.addCleanup(setattr, Page._meta, 'transport', None)
+
+        page = Page.one(self.server.url('/'))
+
+        self.assertEqual(page.title, 'Título')
+        self.assertEqual(self.delays, [0.5])
+
+    def test_token_bucket_burst(self):
+        delays = []
+        bucket = TokenBucket(1, capacity=3, sleep=delays.append)
+
+        for i in range(3):
+            bucket.acquire()
+
+        self.assertEqual(delays, [])
+
+
+if __name__ == '__main__':
+    unittest.main()